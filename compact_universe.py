@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close']
+
+
+class CompactUniverse:
+    """Price histories of many stocks in a few flat NumPy arrays, for scanning a whole universe.
+
+    All stocks share one sorted trading-date axis. Each stock's bars are a contiguous slice
+    [offsets[i], offsets[i + 1]) of the flat arrays: float32 prices, integer volume (uint32
+    when every volume fits) and each bar's position on the date axis (uint16 for up to 65535
+    dates). That is 22-26 bytes per bar instead of a float64 frame with its own DatetimeIndex.
+
+    frame() rebuilds a float64 DataFrame like DataManager.get_stock_data for strategies;
+    column() and latest() read the compact arrays directly.
+    """
+
+    def __init__(self, series, lifetime_highs=None):
+        """series maps stock_code -> (sorted epoch days, {field: values}); lifetime_highs
+        optionally maps stock_code -> all-time high
+        """
+        self.stock_codes = list(series)
+        self._positions = {stock_code: i for i, stock_code in enumerate(self.stock_codes)}
+        lengths = [len(days) for days, _ in series.values()]
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+        if not self.stock_codes:
+            self.dates = np.empty(0, dtype=np.int32)
+            self.date_positions = np.empty(0, dtype=np.uint16)
+            self.prices = {field: np.empty(0, dtype=np.float32) for field in PRICE_FIELDS}
+            self.volume = np.empty(0, dtype=np.uint32)
+            self.lifetime_highs = np.empty(0)
+            return
+
+        all_days = np.concatenate([days for days, _ in series.values()])
+        dates, positions = np.unique(all_days, return_inverse=True)
+        self.dates = dates.astype(np.int32)  # Epoch days
+        self.date_positions = positions.astype(np.uint16 if len(dates) <= np.iinfo(np.uint16).max + 1
+                                               else np.uint32)
+
+        self.prices = {field: np.concatenate([columns[field] for _, columns in series.values()]).astype(np.float32)
+                       for field in PRICE_FIELDS}
+        volume = np.concatenate([columns['Volume'] for _, columns in series.values()])
+        fits_uint32 = len(volume) == 0 or (volume.min() >= 0 and volume.max() <= np.iinfo(np.uint32).max)
+        self.volume = volume.astype(np.uint32 if fits_uint32 else np.int64)
+
+        lifetime_highs = lifetime_highs or {}
+        self.lifetime_highs = np.array([lifetime_highs.get(stock_code, np.nan) for stock_code in self.stock_codes],
+                                       dtype=float)
+
+    def __len__(self):
+        return len(self.stock_codes)
+
+    def __contains__(self, stock_code):
+        return stock_code in self._positions
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays"""
+        arrays = [self.offsets, self.dates, self.date_positions, self.volume, self.lifetime_highs]
+        return sum(array.nbytes for array in arrays) + sum(values.nbytes for values in self.prices.values())
+
+    def _slice(self, stock_code):
+        i = self._positions[stock_code]
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def days(self, stock_code):
+        """Get a stock's bar dates as epoch days"""
+        return self.dates[self.date_positions[self._slice(stock_code)]]
+
+    def column(self, stock_code, field):
+        """Get a read-only view of one stock's field ('Open' ... 'Close' as float32, or 'Volume')"""
+        values = self.volume if field == 'Volume' else self.prices[field]
+        view = values[self._slice(stock_code)]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, field='Close'):
+        """Get every stock's latest value of a field, in stock_codes order"""
+        values = self.volume if field == 'Volume' else self.prices[field]
+        return values[self.offsets[1:] - 1]
+
+    def frame(self, stock_code):
+        """Rebuild a stock's OHLCV DataFrame (float64 prices, DatetimeIndex) for strategies.
+        Returns an empty DataFrame for stocks that are not in the universe.
+        """
+        if stock_code not in self._positions:
+            return pd.DataFrame()
+        bars = self._slice(stock_code)
+        index = pd.DatetimeIndex(self.dates[self.date_positions[bars]].astype('datetime64[D]')
+                                 .astype('datetime64[ns]'), name='Date')
+        columns = {field: self.prices[field][bars].astype(float) for field in PRICE_FIELDS}
+        columns['Volume'] = self.volume[bars].astype('int64')
+        df = pd.DataFrame(columns, index=index, copy=False)
+
+        lifetime_high = self.lifetime_highs[self._positions[stock_code]]
+        if not np.isnan(lifetime_high):
+            df.attrs['lifetime_high'] = float(lifetime_high)
+        return df
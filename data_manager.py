@@ -1,27 +1,219 @@
 # ===== data_manager.py (SQLite version) =====
+import numpy as np
 import pandas as pd
 import sqlite3
 import os
 import json
+import threading
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
 
+from compact_universe import CompactUniverse
+from price_store import ColumnarPriceStore
+
+
+# Period views are date-range slices of one canonical history per stock,
+# measured back from the latest stored bar (SQLite date modifiers)
+PERIOD_OFFSETS = {
+    '1mo': '-1 months',
+    '3mo': '-3 months',
+    '6mo': '-6 months',
+    '1y': '-1 years',
+    '2y': '-2 years',
+    '5y': '-5 years',
+    '10y': '-10 years',
+    'max': None
+}
+
+# Connection settings applied to every SQLite connection. WAL lets dashboard reads run
+# alongside a refresh's writes; NORMAL sync is durable across application crashes in WAL mode.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -65536,  # Negative values are KiB, i.e. 64 MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 30000  # Milliseconds to wait for another writer's lock
+}
+
+# Legacy <code>_<period>.csv files are imported longest period first, so later (shorter)
+# files only revise the recent bars they cover
+CSV_PERIOD_ORDER = ['max', '10y', '5y', '2y', '1y', '6mo', '3mo', '1mo']
+
+# Fundamentals stored in typed columns of fundamental_data (anything else stays in data_json)
+FUNDAMENTAL_COLUMNS = {
+    'company_name': 'TEXT',
+    'industry_sector': 'TEXT',
+    'industry': 'TEXT',
+    'current_price': 'REAL',
+    'pe_ratio': 'REAL',
+    'debt_to_equity': 'REAL',
+    'week_52_high': 'REAL',
+    'week_52_low': 'REAL',
+    'market_cap': 'REAL',
+    'book_value': 'REAL',
+    'dividend_yield': 'REAL',
+    'beta': 'REAL',
+    'earnings_growth': 'REAL',
+    'revenue_growth': 'REAL',
+    'profit_margins': 'REAL',
+    'operating_margins': 'REAL',
+    'return_on_equity': 'REAL',
+    'return_on_assets': 'REAL',
+    'current_ratio': 'REAL',
+    'quick_ratio': 'REAL'
+}
+# Fields the screener filters on most, each with its own index
+SCREENED_FUNDAMENTALS = ['pe_ratio', 'debt_to_equity', 'market_cap', 'return_on_equity', 'dividend_yield']
+
+
+# Shallow copies of cached frames are only isolated from the cache under Copy-on-Write
+_COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3
+
+
+def _read_history_csvs(filepaths):
+    """Parse one stock's legacy history CSVs into a single OHLCV frame (runs in migration
+    worker processes). Files come longest period first; each later file replaces the bars
+    from its first date onward, as saving the files one after another would.
+    Returns: The merged frame, or an error message
+    """
+    try:
+        merged = None
+        for filepath in filepaths:
+            df = pd.read_csv(filepath, index_col=0, parse_dates=True)
+            df.index = pd.DatetimeIndex(df.index)
+            df = df.loc[df.index.notna(), ['Open', 'High', 'Low', 'Close', 'Volume']].astype(float)
+            if df.empty:
+                continue
+            df = df.sort_index()
+            if merged is not None:
+                df = pd.concat([merged[merged.index < df.index[0]], df])
+            merged = df
+        return merged if merged is not None else pd.DataFrame()
+    except Exception as e:
+        return f"{os.path.basename(filepath)}: {e}"
+
+
+class FrameCache:
+    """Thread-safe LRU cache of loaded price frames, bounded by their memory footprint.
+
+    Every frame is cached with the stock's stored frame version (see
+    DataManager._get_frame_versions) and only served while that version is unchanged, so a
+    write committed by any process invalidates exactly the frames of the stocks it wrote.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()  # (stock_code, period) -> (frame, size in bytes, version)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, stock_code, period, version):
+        """Get a copy of a frame cached at the given version that cannot modify the cache,
+        or None on a miss"""
+        key = (stock_code, period)
+        with self.lock:
+            entry = self.frames.get(key)
+            if entry is None or entry[2] != version:
+                if entry is not None and entry[2] < version:
+                    # Written since it was cached
+                    self.current_bytes -= self.frames.pop(key)[1]
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy(deep=not _COPY_ON_WRITE)
+
+    def put(self, stock_code, period, frame, version):
+        """Cache a frame loaded when the stock was at the given version"""
+        size = int(frame.memory_usage(index=True).sum())
+        if size > self.max_bytes:
+            return
+        # A deep copy owns its data: frames built from a batch load are views into the whole
+        # batch's arrays, which size (and so the byte budget) doesn't account for
+        frame = frame.copy(deep=True)
+
+        with self.lock:
+            key = (stock_code, period)
+            if key in self.frames:
+                if self.frames[key][2] > version:
+                    return  # A newer version is already cached
+                self.current_bytes -= self.frames.pop(key)[1]
+            self.frames[key] = (frame, size, version)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.frames.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, stock_codes):
+        """Drop every cached period of the given stocks"""
+        stock_codes = set(stock_codes)
+        with self.lock:
+            for key in [key for key in self.frames if key[0] in stock_codes]:
+                self.current_bytes -= self.frames.pop(key)[1]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.frames),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
 
 class DataManager:
-    def __init__(self):
-        self.data_dir = 'data'
+    def __init__(self, data_dir='data', pragmas=None, frame_cache_bytes=64 * 1024 * 1024,
+                 price_backend='sqlite'):
+        self.data_dir = data_dir
         self.db_path = os.path.join(self.data_dir, 'stocks.db')
 
+        unknown = set(pragmas or {}) - set(DEFAULT_PRAGMAS)
+        if unknown:
+            raise ValueError(f"Unsupported SQLite pragmas: {', '.join(sorted(unknown))}")
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+
+        # One long-lived connection per thread, re-opened after a fork
+        self._local = threading.local()
+
+        # Group membership query results, keyed by query and valid for one membership version
+        self._membership_cache = {}
+        self._membership_lock = threading.Lock()
+
+        # Recently loaded price frames; 0 bytes disables caching
+        self.frame_cache = FrameCache(frame_cache_bytes) if frame_cache_bytes else None
+
+        # Price history lives in the stock_data table, or in memory-mapped column files
+        if price_backend not in ('sqlite', 'columnar'):
+            raise ValueError(f"Unknown price backend: {price_backend}")
+        self.price_store = None
+
         # Create data directory if it doesn't exist
         os.makedirs(self.data_dir, exist_ok=True)
 
         # Initialize database
         self._initialize_database()
 
+        if price_backend == 'columnar':
+            self.price_store = ColumnarPriceStore(os.path.join(self.data_dir, 'columns'))
+            self._import_history_to_price_store()
+
     def _initialize_database(self):
         """Initialize SQLite database with required tables"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            # Every app process initializes at startup; holding the write lock for the whole schema
+            # setup means each one sees either the old schema or the finished new one
+            cursor.execute('BEGIN IMMEDIATE')
 
             # Create stocks table
             cursor.execute('''
@@ -46,21 +238,8 @@ class DataManager:
                 )
             ''')
 
-            # Create stock_data table for OHLCV data
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stock_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    stock_code TEXT NOT NULL,
-                    period TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    open_price REAL,
-                    high_price REAL,
-                    low_price REAL,
-                    close_price REAL,
-                    volume INTEGER,
-                    UNIQUE(stock_code, period, date)
-                )
-            ''')
+            # Create stock_data table for OHLCV data (one canonical history per stock)
+            self._create_stock_data_table(cursor)
 
             # Create fundamental_data table
             cursor.execute('''
@@ -71,24 +250,344 @@ class DataManager:
                     last_updated TEXT NOT NULL
                 )
             ''')
+            self._add_fundamental_columns(cursor)
+
+            # Create lifetime_highs table (all-time high seeded once from max history)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS lifetime_highs (
+                    stock_code TEXT PRIMARY KEY,
+                    lifetime_high REAL NOT NULL,
+                    high_date TEXT,
+                    seeded INTEGER NOT NULL DEFAULT 0,
+                    last_updated TEXT NOT NULL
+                )
+            ''')
+
+            # Create financial_statements table (one row per statement line item and period)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS financial_statements (
+                    stock_code TEXT NOT NULL,
+                    statement TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    line_item TEXT NOT NULL,
+                    period_end TEXT NOT NULL,
+                    value REAL,
+                    PRIMARY KEY (stock_code, statement, frequency, line_item, period_end)
+                )
+            ''')
+
+            # Create financials_checks table (when statements were last requested)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS financials_checks (
+                    stock_code TEXT PRIMARY KEY,
+                    last_checked TEXT NOT NULL
+                )
+            ''')
+
+            # Create data_generation table (single row, bumped by every market data write)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS data_generation (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    generation INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO data_generation (id, generation) VALUES (1, 0)')
+
+            # Create membership_version table (single row, bumped when groups or the portfolio change)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS membership_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO membership_version (id, version) VALUES (1, 0)')
+
+            # Create frame_versions table (per stock, bumped by every write of its bars or lifetime high)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS frame_versions (
+                    stock_code TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+
+            # Create csv_migrations table (legacy history files already imported)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS csv_migrations (
+                    file_name TEXT PRIMARY KEY,
+                    file_size INTEGER NOT NULL,
+                    modified REAL NOT NULL,
+                    migrated_at TEXT NOT NULL
+                )
+            ''')
+
+            # Create refresh_jobs table (background refreshes, shared by every app process)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS refresh_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    mode TEXT NOT NULL,
+                    force_fundamentals INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    done INTEGER NOT NULL,
+                    success_count INTEGER NOT NULL,
+                    skipped_count INTEGER NOT NULL,
+                    error_count INTEGER NOT NULL,
+                    current_symbol TEXT,
+                    rows_json TEXT,
+                    error TEXT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
 
             # Create indexes for better performance
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_stocks_code ON stocks(stock_code)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_stocks_group ON stocks(group_name)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_data_code_period ON stock_data(stock_code, period)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_data_date ON stock_data(date)')
+            for field in SCREENED_FUNDAMENTALS:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_fundamental_{field} ON fundamental_data({field})')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_financial_statements_item 
+                ON financial_statements(statement, frequency, line_item, stock_code, period_end)
+            ''')
+
+            conn.commit()
+
+            # Copy history from an older stock_data layout (resumes if it was interrupted)
+            self._migrate_legacy_history(conn)
+
+    def _create_stock_data_table(self, cursor):
+        """Create the canonical OHLCV history table.
+        Bars are keyed by an integer symbol id and epoch-day date in a WITHOUT ROWID table,
+        so one stock's history is a single contiguous range of the primary key B-tree.
+        A stock_data table in an older layout is renamed aside for _migrate_legacy_history.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS symbols (
+                symbol_id INTEGER PRIMARY KEY,
+                stock_code TEXT NOT NULL UNIQUE
+            )
+        ''')
+
+        cursor.execute('PRAGMA table_info(stock_data)')
+        columns = [row['name'] for row in cursor.fetchall()]
+        if 'stock_code' in columns:
+            print("Moving stock_data aside for migration to the compact layout...")
+            cursor.execute('ALTER TABLE stock_data RENAME TO stock_data_legacy')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_data (
+                symbol_id INTEGER NOT NULL,
+                date INTEGER NOT NULL,
+                open_price REAL,
+                high_price REAL,
+                low_price REAL,
+                close_price REAL,
+                volume INTEGER,
+                PRIMARY KEY (symbol_id, date)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_legacy_history(self, conn, batch_size=200):
+        """Copy bars from the legacy stock_data layout (text stock codes and dates, optionally
+        one copy per period) into the compact table, one committed batch of stocks at a time.
+        Each batch is removed from the legacy table as it is copied, so an interrupted migration
+        resumes with the stocks that are left, and app processes starting together share the work.
+        """
+        cursor = conn.cursor()
+        if not self._has_legacy_history(cursor):
+            return
+
+        cursor.execute('PRAGMA table_info(stock_data_legacy)')
+        legacy_columns = [row['name'] for row in cursor.fetchall()]
+        # Longer periods first so their bars win when several copies hold a date
+        period_order = '''
+            ORDER BY CASE period
+                WHEN 'max' THEN 0
+                WHEN '10y' THEN 1
+                WHEN '5y' THEN 2
+                WHEN '2y' THEN 3
+                WHEN '1y' THEN 4
+                ELSE 5
+            END
+        ''' if 'period' in legacy_columns else ''
+
+        migrated_bars = 0
+        while True:
+            # Another process may have copied the next stocks, or finished, since the last batch
+            cursor.execute('BEGIN IMMEDIATE')
+            if not self._has_legacy_history(cursor):
+                conn.rollback()
+                return
 
+            cursor.execute('''
+                SELECT DISTINCT stock_code FROM stock_data_legacy
+                ORDER BY stock_code LIMIT ?
+            ''', (batch_size,))
+            stock_codes = [row['stock_code'] for row in cursor.fetchall()]
+            if not stock_codes:
+                break
+
+            codes_json = json.dumps(stock_codes)
+            cursor.execute('''
+                INSERT OR IGNORE INTO symbols (stock_code)
+                SELECT value FROM json_each(?)
+            ''', (codes_json,))
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO stock_data
+                (symbol_id, date, open_price, high_price, low_price, close_price, volume)
+                SELECT y.symbol_id, CAST(julianday(l.date) - 2440587.5 AS INTEGER),
+                       l.open_price, l.high_price, l.low_price, l.close_price, l.volume
+                FROM stock_data_legacy l
+                JOIN symbols y ON y.stock_code = l.stock_code
+                WHERE l.stock_code IN (SELECT value FROM json_each(?))
+                {period_order}
+            ''', (codes_json,))
+            migrated_bars += cursor.rowcount
+            cursor.execute('''
+                DELETE FROM stock_data_legacy WHERE stock_code IN (SELECT value FROM json_each(?))
+            ''', (codes_json,))
             conn.commit()
 
+            print(f"Migrated stock_data through {stock_codes[-1]} ({migrated_bars} bars so far)")
+
+        # Still holding the write lock of the last (empty) batch
+        cursor.execute('DROP TABLE stock_data_legacy')
+        conn.commit()
+        print(f"Migrated {migrated_bars} bars into the compact stock_data layout")
+
+        # Give the legacy table's pages back to the file system (needs every other process idle)
+        try:
+            conn.execute('VACUUM')
+        except sqlite3.OperationalError as e:
+            print(f"Skipped VACUUM after the stock_data migration: {e}")
+
+    def _has_legacy_history(self, cursor):
+        """Whether a legacy stock_data table is waiting to be migrated"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'stock_data_legacy'")
+        return cursor.fetchone() is not None
+
+    def _get_symbol_ids(self, cursor, stock_codes, create=False):
+        """Map stock codes to their integer symbol ids, registering missing codes when create is set"""
+        codes_json = json.dumps(list(stock_codes))
+        if create:
+            cursor.execute('''
+                INSERT OR IGNORE INTO symbols (stock_code)
+                SELECT value FROM json_each(?)
+            ''', (codes_json,))
+        cursor.execute('''
+            SELECT stock_code, symbol_id FROM symbols
+            WHERE stock_code IN (SELECT value FROM json_each(?))
+        ''', (codes_json,))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def _connect(self):
+        """Open a new connection with the configured pragmas"""
+        conn = sqlite3.connect(self.db_path, timeout=float(self.pragmas['busy_timeout']) / 1000)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        conn.row_factory = sqlite3.Row  # Enable column access by name
+        """Context manager for the calling thread's database connection.
+        The connection stays open for later calls from the same thread and process; a
+        transaction left uncommitted by the outermost caller is rolled back on exit.
+        """
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # New thread, or a child process that must not share its parent's connection
+            local.conn = self._connect()
+            local.pid = os.getpid()
+            local.depth = 0
+
+        conn = local.conn
+        local.depth += 1
         try:
             yield conn
         finally:
-            conn.close()
+            local.depth -= 1
+            if local.depth == 0 and conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def read_snapshot(self):
+        """Context manager pinning one consistent view of the database for the calling thread.
+        All DataManager reads inside it see the same committed data generation, even while a
+        refresh commits newer ones (WAL readers don't block writers). Don't write inside it.
+        With the columnar backend price files are outside the snapshot: each stock's series is
+        still read whole from one file generation, but may be newer than the snapshot.
+        Yields: The snapshot's data generation id
+        """
+        with self._get_connection() as conn:
+            started = not conn.in_transaction
+            if started:
+                conn.execute('BEGIN')
+            try:
+                # The first read fixes the snapshot
+                yield conn.execute('SELECT generation FROM data_generation').fetchone()[0]
+            finally:
+                if started and conn.in_transaction:
+                    conn.rollback()
+
+    def get_data_generation(self):
+        """Get the id of the latest committed data generation.
+        It increases with every write of prices, lifetime highs, fundamentals or financial
+        statements, so callers can use it as a cache key.
+        """
+        try:
+            with self._get_connection() as conn:
+                return conn.execute('SELECT generation FROM data_generation').fetchone()[0]
+        except Exception as e:
+            print(f"Error getting data generation: {e}")
+            return None
+
+    def _bump_generation(self, cursor):
+        """Start a new data generation; it becomes visible when the write transaction commits"""
+        cursor.execute('UPDATE data_generation SET generation = generation + 1')
+
+    def _bump_membership_version(self, cursor):
+        """Mark cached group membership stale; other processes see it when the write commits"""
+        cursor.execute('UPDATE membership_version SET version = version + 1')
+
+    def _bump_frame_versions(self, cursor, stock_codes):
+        """Mark stocks' cached frames stale in every process once the write transaction commits"""
+        cursor.executemany('''
+            INSERT INTO frame_versions (stock_code, version) VALUES (?, 1)
+            ON CONFLICT(stock_code) DO UPDATE SET version = version + 1
+        ''', [(stock_code,) for stock_code in stock_codes])
+
+    def _get_frame_versions(self, cursor, stock_codes):
+        """Get the stored frame version of each stock (0 if it was never written)"""
+        cursor.execute('''
+            SELECT w.value, COALESCE(v.version, 0) FROM json_each(?) w
+            LEFT JOIN frame_versions v ON v.stock_code = w.value
+        ''', (json.dumps(list(stock_codes)),))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def _cached_membership(self, key, cursor, load):
+        """Serve a membership query from memory while the stored membership version is unchanged.
+        load(cursor) runs the query on a miss. Returns: A fresh copy of the rows (list of dicts)
+        """
+        cursor.execute('SELECT version FROM membership_version')
+        version = cursor.fetchone()[0]
+        with self._membership_lock:
+            cached = self._membership_cache.get(key)
+        if cached is None or cached[0] != version:
+            # Loaded after reading the version, so a concurrent change only makes it stale sooner
+            cached = (version, load(cursor))
+            with self._membership_lock:
+                self._membership_cache[key] = cached
+        # Callers annotate the rows they get, so each gets its own dicts
+        return [dict(row) for row in cached[1]]
+
+    def close(self):
+        """Close the calling thread's connection (it is re-opened on next use)"""
+        local = self._local
+        if getattr(local, 'pid', None) == os.getpid():
+            local.conn.close()
+        local.pid = None
 
     def add_stock_to_group(self, stock_code, group):
         """Add a stock to a specific group with improved error handling"""
@@ -118,6 +617,7 @@ class DataManager:
                     VALUES (?, ?, ?, ?)
                 ''', (stock_code, group, '', datetime.now().strftime('%Y-%m-%d')))
 
+                self._bump_membership_version(cursor)
                 conn.commit()
                 print(f"Stock {stock_code} successfully added to {group}")
                 return True
@@ -126,6 +626,45 @@ class DataManager:
             print(f"Error adding stock {stock_code} to group {group}: {e}")
             return False
 
+    def add_stocks_to_group(self, stock_codes, group):
+        """Add many stocks to a group in one transaction, skipping ones already in it.
+        Returns: (added codes, duplicate codes) in input order, or None on error
+        """
+        codes = []
+        for stock_code in stock_codes:
+            stock_code = str(stock_code).strip().upper()
+            if stock_code and stock_code != 'NAN':
+                codes.append(stock_code)
+
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO stocks (stock_code, group_name, company_name, added_date)
+                    SELECT value, ?, '', ? FROM json_each(?) WHERE true
+                    ON CONFLICT (stock_code, group_name) DO NOTHING
+                    RETURNING stock_code
+                ''', (group, datetime.now().strftime('%Y-%m-%d'), json.dumps(codes)))
+                inserted = {row[0] for row in cursor.fetchall()}
+                if inserted:
+                    self._bump_membership_version(cursor)
+                conn.commit()
+        except Exception as e:
+            print(f"Error adding stocks to group {group}: {e}")
+            return None
+
+        # A code repeated in the input is a duplicate after its first occurrence
+        added, duplicates = [], []
+        for stock_code in codes:
+            if stock_code in inserted:
+                added.append(stock_code)
+                inserted.discard(stock_code)
+            else:
+                duplicates.append(stock_code)
+
+        print(f"Added {len(added)} stocks to {group} ({len(duplicates)} already present)")
+        return added, duplicates
+
     def add_stock_to_portfolio(self, stock_code, quantity, buy_price):
         """Add a stock to personal portfolio with quantity and buy price"""
         try:
@@ -162,6 +701,7 @@ class DataManager:
                         VALUES (?, ?, ?, ?)
                     ''', (stock_code, quantity, buy_price, datetime.now().strftime('%Y-%m-%d')))
 
+                self._bump_membership_version(cursor)
                 conn.commit()
 
                 # Also add to main stocks table
@@ -190,6 +730,8 @@ class DataManager:
                 if group == 'Personal_Portfolio':
                     cursor.execute('DELETE FROM portfolio WHERE stock_code = ?', (stock_code,))
 
+                if deleted_count > 0 or cursor.rowcount > 0:
+                    self._bump_membership_version(cursor)
                 conn.commit()
 
                 if deleted_count > 0:
@@ -204,28 +746,29 @@ class DataManager:
             return False
 
     def get_all_stocks(self):
-        """Get all stocks grouped by group"""
+        """Get all stocks grouped by group (cached until group membership changes)"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
 
-                # Get all stocks with portfolio data
-                cursor.execute('''
-                    SELECT s.*, p.quantity, p.buy_price, p.added_date as portfolio_added_date
-                    FROM stocks s
-                    LEFT JOIN portfolio p ON s.stock_code = p.stock_code
-                    ORDER BY s.group_name, s.stock_code
-                ''')
+                def load(cursor):
+                    # Get all stocks with portfolio data
+                    cursor.execute('''
+                        SELECT s.*, p.quantity, p.buy_price, p.added_date as portfolio_added_date
+                        FROM stocks s
+                        LEFT JOIN portfolio p ON s.stock_code = p.stock_code
+                        ORDER BY s.group_name, s.stock_code
+                    ''')
+                    return [dict(row) for row in cursor.fetchall()]
 
-                rows = cursor.fetchall()
+                rows = self._cached_membership(('all',), cursor, load)
                 stocks_by_group = {}
 
-                for row in rows:
-                    group = row['group_name']
+                for stock_dict in rows:
+                    group = stock_dict['group_name']
                     if group not in stocks_by_group:
                         stocks_by_group[group] = []
 
-                    stock_dict = dict(row)
                     stocks_by_group[group].append(stock_dict)
 
                 return stocks_by_group
@@ -234,29 +777,30 @@ class DataManager:
             return {}
 
     def get_stocks_by_group(self, group):
-        """Get all stocks in a specific group"""
+        """Get all stocks in a specific group (cached until group membership changes)"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
 
-                if group == 'Personal_Portfolio':
-                    # Get stocks with portfolio data
-                    cursor.execute('''
-                        SELECT s.*, p.quantity, p.buy_price, p.added_date as portfolio_added_date
-                        FROM stocks s
-                        LEFT JOIN portfolio p ON s.stock_code = p.stock_code
-                        WHERE s.group_name = ?
-                        ORDER BY s.stock_code
-                    ''', (group,))
-                else:
-                    cursor.execute('''
-                        SELECT * FROM stocks 
-                        WHERE group_name = ?
-                        ORDER BY stock_code
-                    ''', (group,))
-
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                def load(cursor):
+                    if group == 'Personal_Portfolio':
+                        # Get stocks with portfolio data
+                        cursor.execute('''
+                            SELECT s.*, p.quantity, p.buy_price, p.added_date as portfolio_added_date
+                            FROM stocks s
+                            LEFT JOIN portfolio p ON s.stock_code = p.stock_code
+                            WHERE s.group_name = ?
+                            ORDER BY s.stock_code
+                        ''', (group,))
+                    else:
+                        cursor.execute('''
+                            SELECT * FROM stocks 
+                            WHERE group_name = ?
+                            ORDER BY stock_code
+                        ''', (group,))
+                    return [dict(row) for row in cursor.fetchall()]
+
+                return self._cached_membership(('group', group), cursor, load)
         except Exception as e:
             print(f"Error getting stocks by group: {e}")
             return []
@@ -266,143 +810,991 @@ class DataManager:
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT DISTINCT stock_code FROM stocks ORDER BY stock_code')
-                return [row[0] for row in cursor.fetchall()]
+
+                def load(cursor):
+                    cursor.execute('SELECT DISTINCT stock_code FROM stocks ORDER BY stock_code')
+                    return [{'stock_code': row[0]} for row in cursor.fetchall()]
+
+                return [row['stock_code'] for row in self._cached_membership(('codes',), cursor, load)]
         except Exception as e:
             print(f"Error getting stock codes: {e}")
             return []
 
-    def save_stock_data(self, stock_code, data, period):
-        """Save stock OHLCV data"""
+    def save_stock_data(self, stock_code, data, full_history=False, reset_lifetime_high=False):
+        """Save stock OHLCV data, upserting stored bars from the first date in data onward.
+        With full_history the whole stored series is replaced (e.g. after a split), and with
+        reset_lifetime_high the stored lifetime high restarts from data and is marked for re-seeding.
+        Returns: Dictionary of inserted/updated/unchanged/deleted row counts, or None on failure
+        """
+        if data.empty:
+            return None
+        saved = self.save_bulk_stock_data({stock_code: data},
+                                          full_history_codes=[stock_code] if full_history else (),
+                                          reset_high_codes=[stock_code] if reset_lifetime_high else ())
+        return saved[stock_code] if saved else None
+
+    def save_bulk_stock_data(self, stock_frames, full_history_codes=(), reset_high_codes=()):
+        """Save OHLCV data for many stocks in a single transaction.
+        stock_frames maps stock_code -> DataFrame. New bars are inserted and stored bars are
+        only rewritten when their values changed; stored bars covered by a frame's date range
+        but missing from it are deleted. Stocks in full_history_codes have their whole stored
+        series covered, the others only from the first date in their frame onward. Stocks in
+        reset_high_codes (history re-downloaded after an adjustment) have their lifetime high
+        restarted from the frame; every other stock's high is only raised.
+        With the columnar backend each stock's bars are written to its column files and only
+        the lifetime highs share the transaction.
+        Returns: Dictionary of stock_code -> inserted/updated/unchanged/deleted row counts,
+        or None if the transaction was rolled back
+        """
+        if self.price_store:
+            return self._save_columnar_stock_data(stock_frames, full_history_codes, reset_high_codes)
         try:
+            stock_frames = {code: data for code, data in stock_frames.items() if not data.empty}
+            if not stock_frames:
+                return None
+            full_history_codes = set(full_history_codes)
+            reset_high_codes = set(reset_high_codes)
+
+            counts = {}
             with self._get_connection() as conn:
                 cursor = conn.cursor()
+                symbol_ids = self._get_symbol_ids(cursor, stock_frames, create=True)
 
-                # Clear existing data for this stock and period
-                cursor.execute('''
-                    DELETE FROM stock_data 
-                    WHERE stock_code = ? AND period = ?
-                ''', (stock_code, period))
+                for stock_code, data in stock_frames.items():
+                    rows = self._stock_data_rows(symbol_ids[stock_code], data)
+                    dates = [row[1] for row in rows]
+                    # A full history covers every stored date of the stock
+                    covered_from = None if stock_code in full_history_codes else min(dates)
 
-                # Insert new data
-                for date, row in data.iterrows():
                     cursor.execute('''
-                        INSERT OR REPLACE INTO stock_data 
-                        (stock_code, period, date, open_price, high_price, low_price, close_price, volume)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        stock_code,
-                        period,
-                        date.strftime('%Y-%m-%d'),
-                        float(row['Open']),
-                        float(row['High']),
-                        float(row['Low']),
-                        float(row['Close']),
-                        int(row['Volume'])
-                    ))
+                        DELETE FROM stock_data 
+                        WHERE symbol_id = ? AND date >= COALESCE(?, date) 
+                        AND date NOT IN (SELECT value FROM json_each(?))
+                    ''', (symbol_ids[stock_code], covered_from, json.dumps(dates)))
+                    deleted = cursor.rowcount
+
+                    cursor.executemany('''
+                        UPDATE stock_data 
+                        SET open_price = ?3, high_price = ?4, low_price = ?5, close_price = ?6, volume = ?7
+                        WHERE symbol_id = ?1 AND date = ?2 
+                        AND (open_price IS NOT ?3 OR high_price IS NOT ?4 OR low_price IS NOT ?5 
+                             OR close_price IS NOT ?6 OR volume IS NOT ?7)
+                    ''', rows)
+                    updated = cursor.rowcount
+
+                    cursor.executemany('''
+                        INSERT INTO stock_data 
+                        (symbol_id, date, open_price, high_price, low_price, close_price, volume)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(symbol_id, date) DO NOTHING
+                    ''', rows)
+                    inserted = cursor.rowcount
+
+                    counts[stock_code] = {
+                        'inserted': inserted,
+                        'updated': updated,
+                        'unchanged': len(rows) - inserted - updated,
+                        'deleted': deleted
+                    }
+
+                    self._update_lifetime_high(cursor, stock_code, data,
+                                               reset=stock_code in reset_high_codes)
+
+                self._bump_frame_versions(cursor, [stock_code for stock_code in stock_frames
+                                                   if self._counts_changed({stock_code: counts[stock_code]})
+                                                   or stock_code in reset_high_codes])
+                if self._counts_changed(counts) or full_history_codes:
+                    self._bump_generation(cursor)
+                conn.commit()
+            self._invalidate_frames(stock_frames)
+            return counts
+        except Exception as e:
+            print(f"Error saving stock data: {e}")
+            return None
+
+    def _counts_changed(self, counts):
+        """Whether any stock's save inserted, updated or deleted bars"""
+        return any(stock_counts['inserted'] or stock_counts['updated'] or stock_counts['deleted']
+                   for stock_counts in counts.values())
+
+    def _save_columnar_stock_data(self, stock_frames, full_history_codes=(), reset_high_codes=()):
+        """save_bulk_stock_data for the columnar backend"""
+        try:
+            stock_frames = {code: data for code, data in stock_frames.items() if not data.empty}
+            if not stock_frames:
+                return None
+            full_history_codes = set(full_history_codes)
+            reset_high_codes = set(reset_high_codes)
+
+            counts = {}
+            for stock_code, data in stock_frames.items():
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+                columns = {field: data[field].to_numpy(dtype=float) for field in ['Open', 'High', 'Low', 'Close']}
+                columns['Volume'] = data['Volume'].fillna(0).to_numpy(dtype='int64')
+                counts[stock_code] = self.price_store.write(stock_code, self._epoch_days(data.index), columns,
+                                                            full_history=stock_code in full_history_codes)
 
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                for stock_code, data in stock_frames.items():
+                    self._update_lifetime_high(cursor, stock_code, data,
+                                               reset=stock_code in reset_high_codes)
+                self._bump_frame_versions(cursor, [stock_code for stock_code in stock_frames
+                                                   if self._counts_changed({stock_code: counts[stock_code]})
+                                                   or stock_code in reset_high_codes])
+                if self._counts_changed(counts) or full_history_codes:
+                    self._bump_generation(cursor)
                 conn.commit()
-                return True
+            self._invalidate_frames(stock_frames)
+            return counts
         except Exception as e:
             print(f"Error saving stock data: {e}")
+            return None
+
+    def _import_history_to_price_store(self):
+        """Seed an empty columnar store from the stock_data table, one stock at a time"""
+        if self.price_store.stock_codes():
+            return
+
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT stock_code FROM symbols ORDER BY stock_code')
+            stock_codes = [row['stock_code'] for row in cursor.fetchall()]
+            if stock_codes:
+                print(f"Copying price history of {len(stock_codes)} stocks into the columnar store...")
+            for stock_code in stock_codes:
+                series = self._read_sqlite_series(cursor, [stock_code], 'max')
+                if stock_code in series:
+                    days, columns = series[stock_code]
+                    self.price_store.write(stock_code, days, columns, full_history=True)
+
+    def _stock_data_rows(self, symbol_id, data):
+        """Convert an OHLCV frame into stock_data parameter rows, column-wise rather than per bar"""
+        dates = self._epoch_days(data.index).tolist()
+        prices = data[['Open', 'High', 'Low', 'Close']].to_numpy(dtype=float).T.tolist()
+        volumes = data['Volume'].fillna(0).to_numpy(dtype='int64').tolist()
+        return list(zip([symbol_id] * len(dates), dates, *prices, volumes))
+
+    def _epoch_days(self, index):
+        """Encode a DatetimeIndex as integer days since 1970-01-01 (local exchange dates)"""
+        index = pd.DatetimeIndex(index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        return index.values.astype('datetime64[D]').astype('int64')
+
+    def _update_lifetime_high(self, cursor, stock_code, data, reset=False):
+        """Raise the stored lifetime high from newly ingested bars.
+        With reset (history re-downloaded after an adjustment) the stored high is no longer
+        comparable, so it restarts from the new bars and is marked for re-seeding.
+        """
+        high = float(data['High'].max())
+        high_date = data['High'].idxmax().strftime('%Y-%m-%d')
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if reset:
+            cursor.execute('''
+                INSERT OR REPLACE INTO lifetime_highs 
+                (stock_code, lifetime_high, high_date, seeded, last_updated)
+                VALUES (?, ?, ?, 0, ?)
+            ''', (stock_code, high, high_date, now))
+        else:
+            cursor.execute('''
+                INSERT INTO lifetime_highs (stock_code, lifetime_high, high_date, seeded, last_updated)
+                VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(stock_code) DO UPDATE SET
+                    lifetime_high = excluded.lifetime_high,
+                    high_date = excluded.high_date,
+                    last_updated = excluded.last_updated
+                WHERE excluded.lifetime_high > lifetime_highs.lifetime_high
+            ''', (stock_code, high, high_date, now))
+
+    def save_lifetime_high(self, stock_code, lifetime_high, high_date=None):
+        """Seed the lifetime high for a stock from its full (max period) history"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                # Never seed below bars that were ingested after the seed history was fetched
+                if self.price_store:
+                    history = self.price_store.read(stock_code)
+                    stored_high = float(np.nanmax(history[1]['High'])) if history and len(history[0]) else 0
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO lifetime_highs 
+                        (stock_code, lifetime_high, high_date, seeded, last_updated)
+                        VALUES (?, MAX(?, ?), ?, 1, ?)
+                    ''', (stock_code, float(lifetime_high), stored_high, high_date,
+                          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                else:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO lifetime_highs 
+                        (stock_code, lifetime_high, high_date, seeded, last_updated)
+                        SELECT ?, MAX(?, COALESCE(MAX(high_price), 0)), ?, 1, ?
+                        FROM stock_data 
+                        WHERE symbol_id = (SELECT symbol_id FROM symbols WHERE stock_code = ?)
+                    ''', (stock_code, float(lifetime_high), high_date,
+                          datetime.now().strftime('%Y-%m-%d %H:%M:%S'), stock_code))
+
+                self._bump_frame_versions(cursor, [stock_code])
+                self._bump_generation(cursor)
+                conn.commit()
+            self._invalidate_frames([stock_code])
+            return True
+        except Exception as e:
+            print(f"Error saving lifetime high: {e}")
             return False
 
-    def get_stock_data(self, stock_code, period='1y'):
-        """Get stock OHLCV data"""
+    def get_lifetime_high(self, stock_code):
+        """Get the stored lifetime high for a stock (None if unknown)"""
         try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT lifetime_high FROM lifetime_highs WHERE stock_code = ?', (stock_code,))
+                row = cursor.fetchone()
+                return row['lifetime_high'] if row else None
+        except Exception as e:
+            print(f"Error getting lifetime high: {e}")
+            return None
+
+    def get_seeded_lifetime_high_codes(self):
+        """Get the stock codes whose lifetime high has been seeded from max history"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT stock_code FROM lifetime_highs WHERE seeded = 1')
+                return {row['stock_code'] for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting seeded lifetime highs: {e}")
+            return set()
+
+    def get_latest_dates(self):
+        """Get the latest stored bar date for every stock with history"""
+        try:
+            if self.price_store:
+                latest_days = {stock_code: self.price_store.latest_day(stock_code)
+                               for stock_code in self.price_store.stock_codes()}
+                return {stock_code: str(np.datetime64(day, 'D'))
+                        for stock_code, day in latest_days.items() if day is not None}
+
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT date, open_price, high_price, low_price, close_price, volume
-                    FROM stock_data 
-                    WHERE stock_code = ? AND period = ?
-                    ORDER BY date
-                ''', (stock_code, period))
+                    SELECT y.stock_code, date(MAX(d.date) * 86400, 'unixepoch') AS latest_date
+                    FROM stock_data d
+                    JOIN symbols y ON y.symbol_id = d.symbol_id
+                    GROUP BY d.symbol_id
+                ''')
+                return {row['stock_code']: row['latest_date'] for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting latest stock dates: {e}")
+            return {}
 
-                rows = cursor.fetchall()
-                if not rows:
-                    return pd.DataFrame()
-
-                # Convert to DataFrame
-                data = []
-                for row in rows:
-                    data.append({
-                        'Date': row['date'],
-                        'Open': row['open_price'],
-                        'High': row['high_price'],
-                        'Low': row['low_price'],
-                        'Close': row['close_price'],
-                        'Volume': row['volume']
-                    })
-
-                df = pd.DataFrame(data)
-                df['Date'] = pd.to_datetime(df['Date'])
-                df.set_index('Date', inplace=True)
-                return df
+    def is_history_stale(self, stock_code, data, tolerance=0.001):
+        """Check whether freshly fetched bars disagree with stored closes on overlapping dates.
+        Yahoo back-adjusts prices after splits and dividends, so a mismatch means the
+        stored history needs a full re-download. The latest stored bar is ignored because
+        it may have been saved mid-session.
+        """
+        try:
+            if data.empty:
+                return False
+
+            days = self._epoch_days(data.index)
+            if self.price_store:
+                history = self.price_store.read(stock_code, start_day=int(days.min()))
+                if history is None:
+                    return False
+                stored_days, stored_columns = history
+                stored_closes = dict(zip(stored_days[:-1].tolist(), stored_columns['Close'][:-1].tolist()))
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    symbol_ids = self._get_symbol_ids(cursor, [stock_code])
+                    if stock_code not in symbol_ids:
+                        return False
+
+                    cursor.execute('''
+                        SELECT date, close_price FROM stock_data
+                        WHERE symbol_id = ?1 AND date >= ?2 AND date < (
+                            SELECT MAX(date) FROM stock_data WHERE symbol_id = ?1
+                        )
+                    ''', (symbol_ids[stock_code], int(days.min())))
+                    stored_closes = {row['date']: row['close_price'] for row in cursor.fetchall()}
+
+            for day, date, close in zip(days.tolist(), data.index, data['Close']):
+                stored_close = stored_closes.get(day)
+                if stored_close and abs(close - stored_close) / stored_close > tolerance:
+                    print(f"Stored history for {stock_code} is stale on {date:%Y-%m-%d} ({stored_close} vs {close})")
+                    return True
+            return False
+        except Exception as e:
+            print(f"Error checking stock history for {stock_code}: {e}")
+            return True
+
+    def get_stock_data(self, stock_code, period='1y'):
+        """Get stock OHLCV data for a period view ('1y', '2y', '5y', 'max', ...)"""
+        return self.get_bulk_stock_data([stock_code], period).get(stock_code, pd.DataFrame())
+
+    def get_bulk_stock_data(self, stock_codes=None, period='1y', group=None, as_panel=False, as_compact=False):
+        """Get OHLCV data for many stocks (a list of codes, or every stock in a group) in one query.
+        Per-stock frames are served from the frame cache when possible. The bars are read in
+        one snapshot, so a refresh committing meanwhile never yields a half-written series.
+        Returns: Dictionary of stock_code -> DataFrame like get_stock_data, or with as_panel a
+        dictionary of field ('Open', 'High', 'Low', 'Close', 'Volume') -> DataFrame of stocks x dates,
+        aligned on the union of their dates (NaN where a stock has no bar), or with as_compact a
+        CompactUniverse (float32 arrays on a shared date axis) for holding many stocks in memory
+        """
+        frames = {}
+        cache = self.frame_cache if not (as_panel or as_compact) else None
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # Plain tuples; columns are split out below
+
+                # Bars, lifetime highs and cached frames' versions all come from one data generation
+                with self.read_snapshot():
+                    if group is not None:
+                        cursor.execute('SELECT DISTINCT stock_code FROM stocks WHERE group_name = ?', (group,))
+                        stock_codes = [row[0] for row in cursor.fetchall()]
+                    stock_codes = list(dict.fromkeys(stock_codes))
+
+                    if cache:
+                        # Versions are stored, so writes by other processes are seen as well
+                        versions = self._get_frame_versions(cursor, stock_codes)
+                        for stock_code in list(stock_codes):
+                            cached = cache.get(stock_code, period, versions[stock_code])
+                            if cached is not None:
+                                frames[stock_code] = cached
+                                stock_codes.remove(stock_code)
+                        if not stock_codes:
+                            return frames
+
+                    if self.price_store:
+                        series = self._read_columnar_series(cursor, stock_codes, period)
+                    else:
+                        # The compact universe keeps float32 prices, so read them as such
+                        series = self._read_sqlite_series(cursor, stock_codes, period,
+                                                          price_dtype=np.float32 if as_compact else float)
+
+                    # True all-time highs, beyond the windows returned here
+                    cursor.execute('''
+                        SELECT stock_code, lifetime_high FROM lifetime_highs
+                        WHERE stock_code IN (SELECT value FROM json_each(?))
+                    ''', (json.dumps(list(series)),))
+                    lifetime_highs = dict(cursor.fetchall())
+
+            if as_compact:
+                return CompactUniverse(series, lifetime_highs)
+
+            if not series:
+                return frames
+
+            if as_panel:
+                return self._price_panel(series)
+
+            for stock_code, (days, columns) in series.items():
+                df = pd.DataFrame(columns, index=self._dates_from_epoch_days(days), copy=False)
+                if stock_code in lifetime_highs:
+                    df.attrs['lifetime_high'] = lifetime_highs[stock_code]
+                if cache:
+                    cache.put(stock_code, period, df, versions[stock_code])
+                frames[stock_code] = df
+            return frames
 
         except Exception as e:
             print(f"Error getting stock data: {e}")
-            return pd.DataFrame()
+            return CompactUniverse({}) if as_compact else {}
+
+    def _read_sqlite_series(self, cursor, stock_codes, period, price_dtype=float, fetch_size=16384):
+        """Load stocks' period windows from stock_data in one query.
+        Rows are streamed into arrays sized by a count of the window, so bars are never all
+        held as Python tuples; price_dtype (e.g. float32) sets the price arrays' type.
+        Returns: Dictionary of stock_code -> (epoch days, {field: values}) for stocks with bars
+        """
+        symbol_ids = self._get_symbol_ids(cursor, stock_codes)
+        codes_by_id = {symbol_id: stock_code for stock_code, symbol_id in symbol_ids.items()}
+
+        # Each stock's window is measured back from its own latest bar; the scalar
+        # MIN/MAX subqueries are answered from the primary key without scanning bars
+        if PERIOD_OFFSETS.get(period):
+            start_date = '''CAST(julianday(
+                (SELECT MAX(date) FROM stock_data WHERE symbol_id = w.value) * 86400, 'unixepoch', ?2
+            ) - 2440587.5 AS INTEGER)'''
+            params = (json.dumps(list(codes_by_id)), PERIOD_OFFSETS[period])
+        else:
+            start_date = '(SELECT MIN(date) FROM stock_data WHERE symbol_id = w.value)'
+            params = (json.dumps(list(codes_by_id)),)
+        window = f'''
+            FROM json_each(?1) w
+            JOIN stock_data d ON d.symbol_id = w.value AND d.date >= {start_date}
+        '''
+
+        # The count and the rows must see the same bars
+        with self.read_snapshot():
+            cursor.execute(f'SELECT COUNT(*) {window}', params)
+            total = cursor.fetchone()[0]
+            if not total:
+                return {}
+
+            ids = np.empty(total, dtype='int64')
+            days = np.empty(total, dtype='int64')
+            columns = {field: np.empty(total, dtype=price_dtype) for field in ['Open', 'High', 'Low', 'Close']}
+            columns['Volume'] = np.empty(total, dtype='int64')
+
+            cursor.execute(f'''
+                SELECT d.symbol_id, d.date, d.open_price, d.high_price, d.low_price, d.close_price, d.volume
+                {window}
+            ''', params)
+            filled = 0
+            while rows := cursor.fetchmany(fetch_size):
+                block = slice(filled, filled + len(rows))
+                chunk_ids, chunk_days, opens, highs, lows, closes, volumes = zip(*rows)
+                ids[block] = chunk_ids
+                days[block] = chunk_days
+                columns['Open'][block] = opens
+                columns['High'][block] = highs
+                columns['Low'][block] = lows
+                columns['Close'][block] = closes
+                columns['Volume'][block] = volumes
+                filled += len(rows)
+
+        # Rows normally arrive grouped by stock in date order; sort only if they don't
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        in_order = (len(np.unique(ids[starts])) == len(starts) and
+                    not np.any((days[1:] <= days[:-1]) & (ids[1:] == ids[:-1])))
+        if not in_order:
+            order = np.lexsort((days, ids))
+            ids = ids[order]
+            days = days[order]
+            columns = {field: values[order] for field, values in columns.items()}
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+
+        # Each stock is now one contiguous slice
+        ends = np.r_[starts[1:], len(ids)]
+        series = {}
+        for symbol_id, start, end in zip(ids[starts].tolist(), starts.tolist(), ends.tolist()):
+            series[codes_by_id[symbol_id]] = (days[start:end],
+                                              {field: values[start:end] for field, values in columns.items()})
+        return series
+
+    def _read_columnar_series(self, cursor, stock_codes, period):
+        """Load stocks' period windows from the columnar store as memory-mapped views.
+        Returns: Dictionary of stock_code -> (epoch days, {field: values}) for stocks with bars
+        """
+        stored = {}
+        for stock_code in stock_codes:
+            history = self.price_store.read(stock_code)
+            if history is not None and len(history[0]):
+                stored[stock_code] = history
+
+        offset = PERIOD_OFFSETS.get(period)
+        if not offset or not stored:
+            return stored
+
+        # Window starts use the same SQLite date arithmetic as the stock_data backend
+        latest_days = [int(days[-1]) for days, _ in stored.values()]
+        cursor.execute('''
+            SELECT CAST(julianday(value * 86400, 'unixepoch', ?) - 2440587.5 AS INTEGER)
+            FROM json_each(?) ORDER BY key
+        ''', (offset, json.dumps(latest_days)))
+        start_days = [row[0] for row in cursor.fetchall()]
+
+        series = {}
+        for (stock_code, (days, columns)), start_day in zip(stored.items(), start_days):
+            start = int(np.searchsorted(days, start_day))
+            series[stock_code] = (days[start:], {field: values[start:] for field, values in columns.items()})
+        return series
+
+    def _price_panel(self, series):
+        """Align per-stock series into a dictionary of field -> DataFrame of stocks x dates"""
+        all_days, date_positions = np.unique(np.concatenate([days for days, _ in series.values()]),
+                                             return_inverse=True)
+        stock_positions = np.repeat(np.arange(len(series)), [len(days) for days, _ in series.values()])
+        index = pd.Index(list(series), name='stock_code')
+        dates = self._dates_from_epoch_days(all_days)
+
+        panel = {}
+        for field in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            grid = np.full((len(series), len(all_days)), np.nan)
+            grid[stock_positions, date_positions] = np.concatenate([columns[field] for _, columns in series.values()])
+            panel[field] = pd.DataFrame(grid, index=index, columns=dates)
+        return panel
+
+    def _invalidate_frames(self, stock_codes):
+        """Drop cached frames of stocks whose history or lifetime high was just written"""
+        if self.frame_cache:
+            self.frame_cache.invalidate(stock_codes)
+
+    def get_frame_cache_stats(self):
+        """Get frame cache hit/miss/eviction counters and its current size"""
+        return self.frame_cache.stats() if self.frame_cache else {}
+
+    def _dates_from_epoch_days(self, days):
+        """Decode integer epoch days into a DatetimeIndex"""
+        return pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'), name='Date')
+
+    def _add_fundamental_columns(self, cursor):
+        """Add missing typed fundamental columns, filling them from data_json of existing rows"""
+        cursor.execute('PRAGMA table_info(fundamental_data)')
+        existing = {row['name'] for row in cursor.fetchall()}
+        missing = [field for field in FUNDAMENTAL_COLUMNS if field not in existing]
+        if not missing:
+            return
+
+        for field in missing:
+            cursor.execute(f'ALTER TABLE fundamental_data ADD COLUMN {field} {FUNDAMENTAL_COLUMNS[field]}')
+
+        # Only values that match the column type are copied; the blob keeps the originals
+        assignments = []
+        for field in missing:
+            value_type = "'text'" if FUNDAMENTAL_COLUMNS[field] == 'TEXT' else "'integer', 'real'"
+            assignments.append(
+                f"{field} = CASE WHEN json_type(data_json, '$.{field}') IN ({value_type}) "
+                f"THEN json_extract(data_json, '$.{field}') END"
+            )
+        cursor.execute(f'UPDATE fundamental_data SET {", ".join(assignments)}')
+        if cursor.rowcount:
+            print(f"Filled typed fundamental columns for {cursor.rowcount} stocks")
+
+    def _typed_fundamental(self, value, column_type):
+        """Convert a fundamental value for its typed column (None if it doesn't fit)"""
+        if value is None:
+            return None
+        if column_type == 'TEXT':
+            return value if isinstance(value, str) else None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return value if np.isfinite(value) else None
 
     def save_fundamental_data(self, stock_code, data):
-        """Save fundamental data for a stock"""
+        """Save fundamental data for a stock.
+        Known fields go to typed columns; the rest (and values that don't fit their column's type)
+        are kept in data_json.
+        """
         try:
+            typed = {}
+            extra = dict(data)
+            for field, column_type in FUNDAMENTAL_COLUMNS.items():
+                if field not in extra:
+                    continue
+                value = self._typed_fundamental(extra[field], column_type)
+                if value is not None or extra[field] is None:
+                    typed[field] = value
+                    del extra[field]
+
+            columns = ['stock_code', 'data_json', 'last_updated'] + list(typed)
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO fundamental_data 
-                    (stock_code, data_json, last_updated)
-                    VALUES (?, ?, ?)
-                ''', (stock_code, json.dumps(data), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO fundamental_data ({', '.join(columns)})
+                    VALUES ({', '.join('?' * len(columns))})
+                ''', (stock_code, json.dumps(extra), datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                      *typed.values()))
 
+                self._bump_generation(cursor)
                 conn.commit()
                 return True
         except Exception as e:
             print(f"Error saving fundamental data: {e}")
             return False
 
+    def get_fundamentals_last_updated(self):
+        """Get when fundamentals were last saved, for every stock that has them"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT stock_code, last_updated FROM fundamental_data')
+                return {
+                    row['stock_code']: datetime.strptime(row['last_updated'], '%Y-%m-%d %H:%M:%S')
+                    for row in cursor.fetchall()
+                }
+        except Exception as e:
+            print(f"Error getting fundamentals freshness: {e}")
+            return {}
+
     def get_fundamental_data(self, stock_code):
         """Get fundamental data for a stock"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT data_json FROM fundamental_data 
+                cursor.execute(f'''
+                    SELECT data_json, {', '.join(FUNDAMENTAL_COLUMNS)} FROM fundamental_data 
                     WHERE stock_code = ?
                 ''', (stock_code,))
 
                 row = cursor.fetchone()
-                if row:
-                    return json.loads(row['data_json'])
-                else:
+                if not row:
                     return {}
+
+                data = json.loads(row['data_json'])
+                for field in FUNDAMENTAL_COLUMNS:
+                    # Fields without a value are left out, so callers' defaults apply; rows saved
+                    # before the typed columns existed still carry the value in data_json
+                    if row[field] is not None:
+                        data[field] = row[field]
+
+                # Lifetime high is tracked separately from the fundamentals snapshot
+                cursor.execute('SELECT lifetime_high FROM lifetime_highs WHERE stock_code = ?', (stock_code,))
+                high_row = cursor.fetchone()
+                if high_row:
+                    data['lifetime_high'] = high_row['lifetime_high']
+                else:
+                    data.setdefault('lifetime_high', data.get('week_52_high', 0))
+
+                # TTM figures from stored quarterly statements, when available
+                ttm = {}
+                for key, line_item in [('revenue', 'Total Revenue'), ('net_income', 'Net Income')]:
+                    metrics = self.get_ttm_metrics(line_item, stock_codes=[stock_code])
+                    if stock_code in metrics:
+                        ttm[key] = metrics[stock_code]
+                if ttm:
+                    data['ttm'] = ttm
+                return data
         except Exception as e:
             print(f"Error getting fundamental data: {e}")
             return {}
 
-    def migrate_from_csv(self):
-        """Migration helper to import existing CSV data into SQLite"""
+    def screen_fundamentals(self, filters, group=None, order_by=None):
+        """Find stocks whose typed fundamentals pass every filter, in one query.
+        filters is a list of (field, operator, value), e.g. [('pe_ratio', '<', 25), ('debt_to_equity', '<', 50)].
+        Stocks with no value for a filtered field are excluded.
+        Returns: List of dictionaries with stock_code and the typed fundamental fields
+        """
+        operators = {'<', '<=', '>', '>=', '=', '!='}
+        conditions = []
+        params = []
+        for field, operator, value in filters:
+            if field not in FUNDAMENTAL_COLUMNS or operator not in operators:
+                raise ValueError(f"Unsupported fundamental filter: {field} {operator}")
+            conditions.append(f'f.{field} {operator} ?')
+            params.append(value)
+
+        if group is not None:
+            conditions.append('f.stock_code IN (SELECT stock_code FROM stocks WHERE group_name = ?)')
+            params.append(group)
+
+        order_field = order_by.lstrip('-') if order_by else 'stock_code'
+        if order_field != 'stock_code' and order_field not in FUNDAMENTAL_COLUMNS:
+            raise ValueError(f"Unsupported sort field: {order_by}")
+        direction = 'DESC' if order_by and order_by.startswith('-') else 'ASC'
+
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT f.stock_code, {', '.join('f.' + field for field in FUNDAMENTAL_COLUMNS)}
+                    FROM fundamental_data f
+                    {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                    ORDER BY f.{order_field} {direction}
+                ''', params)
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error screening fundamentals: {e}")
+            return []
+
+    def save_financial_statements(self, stock_code, financials):
+        """Save financial statements from the market data provider as normalized rows.
+        financials maps statement names (income_statement, quarterly_income_statement, ...)
+        to {period_end: {line_item: value}}. Saving an empty dict only records the check.
+        """
+        try:
+            rows = []
+            for statement_key, periods in (financials or {}).items():
+                frequency = 'quarterly' if statement_key.startswith('quarterly_') else 'annual'
+                statement = statement_key.replace('quarterly_', '', 1)
+                for period_end, line_items in (periods or {}).items():
+                    period_end = pd.Timestamp(period_end).strftime('%Y-%m-%d')
+                    for line_item, value in (line_items or {}).items():
+                        if value is None or pd.isna(value):
+                            continue
+                        rows.append((stock_code, statement, frequency, str(line_item), period_end, float(value)))
+
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO financial_statements 
+                    (stock_code, statement, frequency, line_item, period_end, value)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                cursor.execute('''
+                    INSERT OR REPLACE INTO financials_checks (stock_code, last_checked)
+                    VALUES (?, ?)
+                ''', (stock_code, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+                if rows:
+                    self._bump_generation(cursor)
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving financial statements for {stock_code}: {e}")
+            return False
+
+    def get_financials_due(self, stock_codes, recheck_days=7):
+        """Get the stocks whose financial statements should be fetched.
+        A stock is due when it was never checked, or when a quarter has ended since its latest
+        stored quarter and it has not been checked in the last recheck_days days.
+        """
         try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT c.stock_code, c.last_checked, MAX(f.period_end) AS latest_quarter
+                    FROM financials_checks c
+                    LEFT JOIN financial_statements f
+                        ON f.stock_code = c.stock_code AND f.frequency = 'quarterly'
+                    GROUP BY c.stock_code
+                ''')
+                checks = {row['stock_code']: (row['last_checked'], row['latest_quarter'])
+                          for row in cursor.fetchall()}
+
+            now = datetime.now()
+            due = []
+            for stock_code in stock_codes:
+                if stock_code not in checks:
+                    due.append(stock_code)
+                    continue
+
+                last_checked, latest_quarter = checks[stock_code]
+                if now - datetime.strptime(last_checked, '%Y-%m-%d %H:%M:%S') < pd.Timedelta(days=recheck_days):
+                    continue
+                if latest_quarter is None or pd.Timestamp(now) >= pd.Timestamp(latest_quarter) + pd.DateOffset(months=3):
+                    due.append(stock_code)
+            return due
+        except Exception as e:
+            print(f"Error getting financials due for refresh: {e}")
+            return list(stock_codes)
+
+    def get_financial_statement(self, stock_code, statement='income_statement', frequency='quarterly'):
+        """Get one financial statement as a DataFrame (line items x period ends)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT line_item, period_end, value FROM financial_statements
+                    WHERE stock_code = ? AND statement = ? AND frequency = ?
+                ''', (stock_code, statement, frequency))
+                rows = cursor.fetchall()
+
+            if not rows:
+                return pd.DataFrame()
+
+            df = pd.DataFrame([dict(row) for row in rows])
+            return df.pivot(index='line_item', columns='period_end', values='value').sort_index(axis=1)
+        except Exception as e:
+            print(f"Error getting financial statement: {e}")
+            return pd.DataFrame()
+
+    def get_ttm_metrics(self, line_item='Total Revenue', stock_codes=None):
+        """Compute trailing-twelve-month figures for a quarterly income statement line item.
+        Runs as one indexed query across all stocks (or the given stock codes).
+        Returns: Dictionary of stock_code -> {'ttm', 'previous_ttm', 'growth', 'highest_ttm', 'ttm_at_highest'}
+        """
+        try:
+            code_filter = ''
+            params = [line_item]
+            if stock_codes is not None:
+                stock_codes = list(stock_codes)
+                code_filter = f"AND stock_code IN ({','.join('?' * len(stock_codes))})"
+                params.extend(stock_codes)
+
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    WITH quarters AS (
+                        SELECT stock_code, period_end, value,
+                               ROW_NUMBER() OVER (PARTITION BY stock_code ORDER BY period_end DESC) AS recency
+                        FROM financial_statements
+                        WHERE statement = 'income_statement' AND frequency = 'quarterly' AND line_item = ?
+                        {code_filter}
+                    ),
+                    ttm AS (
+                        SELECT stock_code, recency,
+                               SUM(value) OVER rolling AS ttm_value,
+                               COUNT(value) OVER rolling AS quarter_count
+                        FROM quarters
+                        WINDOW rolling AS (PARTITION BY stock_code ORDER BY period_end
+                                           ROWS BETWEEN 3 PRECEDING AND CURRENT ROW)
+                    )
+                    SELECT stock_code,
+                           MAX(CASE WHEN recency = 1 THEN ttm_value END) AS ttm,
+                           MAX(CASE WHEN recency = 5 THEN ttm_value END) AS previous_ttm,
+                           MAX(ttm_value) AS highest_ttm
+                    FROM ttm
+                    WHERE quarter_count = 4
+                    GROUP BY stock_code
+                ''', params)
+                rows = cursor.fetchall()
+
+            metrics = {}
+            for row in rows:
+                ttm_value = row['ttm']
+                previous_ttm = row['previous_ttm']
+                if ttm_value is None:
+                    continue
+                metrics[row['stock_code']] = {
+                    'ttm': ttm_value,
+                    'previous_ttm': previous_ttm,
+                    'growth': (ttm_value - previous_ttm) / abs(previous_ttm) if previous_ttm else None,
+                    'highest_ttm': row['highest_ttm'],
+                    'ttm_at_highest': ttm_value >= row['highest_ttm']
+                }
+            return metrics
+        except Exception as e:
+            print(f"Error computing TTM metrics for {line_item}: {e}")
+            return {}
+
+    def claim_refresh_job(self, job, stale_seconds=60, keep=20):
+        """Record a new running refresh job unless another one is still running.
+        job is a dictionary of refresh_jobs columns. The check and the insert share one write
+        transaction, so concurrent app processes can't both start a refresh. A running job
+        whose progress hasn't been saved for stale_seconds is taken to have died with its
+        process. Only the latest `keep` jobs are kept.
+        Returns: (job record, claimed) where the record is the running job when claimed is False,
+        or (None, False) on failure
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                # Take the write lock before looking, so the check can't go stale before the insert
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute("SELECT * FROM refresh_jobs WHERE status = 'running' ORDER BY started_at DESC")
+                for row in cursor.fetchall():
+                    if row['updated_at'] >= job['updated_at'] - stale_seconds:
+                        return dict(row), False
+                    cursor.execute('''
+                        UPDATE refresh_jobs SET status = 'failed', error = ?, finished_at = ?
+                        WHERE job_id = ?
+                    ''', ('Refresh stopped responding', row['updated_at'], row['job_id']))
+
+                cursor.execute(f'''
+                    INSERT INTO refresh_jobs ({', '.join(job)})
+                    VALUES ({', '.join('?' * len(job))})
+                ''', tuple(job.values()))
+                cursor.execute('''
+                    DELETE FROM refresh_jobs WHERE job_id NOT IN (
+                        SELECT job_id FROM refresh_jobs ORDER BY started_at DESC LIMIT ?
+                    )
+                ''', (keep,))
+                conn.commit()
+                return dict(job), True
+        except Exception as e:
+            print(f"Error claiming refresh job: {e}")
+            return None, False
+
+    def update_refresh_job(self, job):
+        """Save a refresh job's progress (job is a dictionary of refresh_jobs columns)"""
+        try:
+            with self._get_connection() as conn:
+                columns = [column for column in job if column != 'job_id']
+                conn.execute(f'''
+                    UPDATE refresh_jobs SET {', '.join(f'{column} = ?' for column in columns)}
+                    WHERE job_id = ?
+                ''', (*(job[column] for column in columns), job['job_id']))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error saving refresh job: {e}")
+            return False
+
+    def get_refresh_job(self, job_id=None):
+        """Get a refresh job's record by id, or the latest job's when no id is given (None if unknown)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if job_id:
+                    cursor.execute('SELECT * FROM refresh_jobs WHERE job_id = ?', (job_id,))
+                else:
+                    cursor.execute('SELECT * FROM refresh_jobs ORDER BY started_at DESC LIMIT 1')
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            print(f"Error getting refresh job: {e}")
+            return None
+
+    def _migrate_history_csvs(self, workers, batch_size):
+        """Import <code>_<period>.csv history files not imported yet (or changed since)"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_name, file_size, modified FROM csv_migrations')
+            migrated = {row['file_name']: (row['file_size'], row['modified']) for row in cursor.fetchall()}
+
+        stock_files = {}
+        skipped = 0
+        for filename in os.listdir(self.data_dir):
+            if filename.endswith('.csv') and '_' in filename and filename not in ['stocks.csv', 'portfolio.csv']:
+                stock_code, period = filename[:-len('.csv')].rsplit('_', 1)  # Codes may contain underscores
+                stat = os.stat(os.path.join(self.data_dir, filename))
+                if migrated.get(filename) == (stat.st_size, stat.st_mtime):
+                    skipped += 1
+                    continue
+                rank = CSV_PERIOD_ORDER.index(period) if period in CSV_PERIOD_ORDER else len(CSV_PERIOD_ORDER)
+                stock_files.setdefault(stock_code, []).append((rank, filename, stat))
+        if not stock_files:
+            return
+
+        stock_codes = sorted(stock_files)
+        for stock_code in stock_codes:
+            stock_files[stock_code].sort()
+        print(f"Migrating history of {len(stock_codes)} stocks ({skipped} files already migrated)")
+
+        done = 0
+        batch = {}
+        batch_files = []
+
+        def flush():
+            if batch and self.save_bulk_stock_data(batch) is None:
+                print(f"Error migrating history for {', '.join(batch)}; it will be retried on the next run")
+            elif batch_files:
+                # Recorded after the bars are committed: a crash in between only repeats this batch
+                with self._get_connection() as conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO csv_migrations (file_name, file_size, modified, migrated_at)
+                        VALUES (?, ?, ?, ?)
+                    ''', [(filename, stat.st_size, stat.st_mtime, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                          for _, filename, stat in batch_files])
+                    conn.commit()
+            print(f"Migrated history of {done}/{len(stock_codes)} stocks")
+            batch.clear()
+            batch_files.clear()
+
+        paths = [[os.path.join(self.data_dir, filename) for _, filename, _ in stock_files[stock_code]]
+                 for stock_code in stock_codes]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = pool.map(_read_history_csvs, paths, chunksize=max(1, min(16, len(paths) // 64)))
+            for stock_code, result in zip(stock_codes, parsed):
+                done += 1
+                if isinstance(result, str):
+                    print(f"Error migrating {result}")
+                    continue
+                if not result.empty:
+                    batch[stock_code] = result
+                batch_files.extend(stock_files[stock_code])
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+
+    def migrate_from_csv(self, workers=None, batch_size=100):
+        """Migration helper to import existing CSV data into SQLite.
+        History files are parsed in a process pool of workers and written in batches of
+        batch_size stocks per transaction. Imported files are recorded, so an interrupted
+        migration resumes with the files it had not finished.
+        """
+        try:
+            today = datetime.now().strftime('%Y-%m-%d')
+
             # Migrate stocks.csv
             stocks_csv = os.path.join(self.data_dir, 'stocks.csv')
             if os.path.exists(stocks_csv):
                 df = pd.read_csv(stocks_csv)
+                rows = [(row.get('stock_code', ''), row.get('group', ''), row.get('company_name', ''),
+                         row.get('added_date', today)) for row in df.to_dict('records')]
                 with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    for _, row in df.iterrows():
-                        try:
-                            cursor.execute('''
-                                INSERT OR IGNORE INTO stocks 
-                                (stock_code, group_name, company_name, added_date)
-                                VALUES (?, ?, ?, ?)
-                            ''', (
-                                row.get('stock_code', ''),
-                                row.get('group', ''),
-                                row.get('company_name', ''),
-                                row.get('added_date', datetime.now().strftime('%Y-%m-%d'))
-                            ))
-                        except Exception as e:
-                            print(f"Error migrating stock row: {e}")
+                    conn.executemany('''
+                        INSERT OR IGNORE INTO stocks 
+                        (stock_code, group_name, company_name, added_date)
+                        VALUES (?, ?, ?, ?)
+                    ''', rows)
+                    self._bump_membership_version(conn.cursor())
                     conn.commit()
                 print(f"Migrated {len(df)} stocks from CSV")
 
@@ -410,40 +1802,25 @@ class DataManager:
             portfolio_csv = os.path.join(self.data_dir, 'portfolio.csv')
             if os.path.exists(portfolio_csv):
                 df = pd.read_csv(portfolio_csv)
+                rows = []
+                for row in df.to_dict('records'):
+                    try:
+                        rows.append((row.get('stock_code', ''), float(row.get('quantity', 0)),
+                                     float(row.get('buy_price', 0)), row.get('added_date', today)))
+                    except Exception as e:
+                        print(f"Error migrating portfolio row: {e}")
                 with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    for _, row in df.iterrows():
-                        try:
-                            cursor.execute('''
-                                INSERT OR IGNORE INTO portfolio 
-                                (stock_code, quantity, buy_price, added_date)
-                                VALUES (?, ?, ?, ?)
-                            ''', (
-                                row.get('stock_code', ''),
-                                float(row.get('quantity', 0)),
-                                float(row.get('buy_price', 0)),
-                                row.get('added_date', datetime.now().strftime('%Y-%m-%d'))
-                            ))
-                        except Exception as e:
-                            print(f"Error migrating portfolio row: {e}")
+                    conn.executemany('''
+                        INSERT OR IGNORE INTO portfolio 
+                        (stock_code, quantity, buy_price, added_date)
+                        VALUES (?, ?, ?, ?)
+                    ''', rows)
+                    self._bump_membership_version(conn.cursor())
                     conn.commit()
-                print(f"Migrated {len(df)} portfolio entries from CSV")
+                print(f"Migrated {len(rows)} portfolio entries from CSV")
 
             # Migrate individual stock data files
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.csv') and '_' in filename and filename not in ['stocks.csv', 'portfolio.csv']:
-                    try:
-                        parts = filename.replace('.csv', '').split('_')
-                        if len(parts) >= 2:
-                            stock_code = '_'.join(parts[:-1])  # Handle stock codes with underscores
-                            period = parts[-1]
-
-                            filepath = os.path.join(self.data_dir, filename)
-                            df = pd.read_csv(filepath, index_col=0, parse_dates=True)
-                            self.save_stock_data(stock_code, df, period)
-                            print(f"Migrated data for {stock_code} ({period})")
-                    except Exception as e:
-                        print(f"Error migrating {filename}: {e}")
+            self._migrate_history_csvs(workers, batch_size)
 
             # Migrate fundamental data JSON files
             for filename in os.listdir(self.data_dir):
@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import random
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# Yahoo-style period strings as offsets back from the latest bar
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+    'max': None
+}
+
+
+def _bars_since(data, start):
+    """Bars of an OHLCV frame from the start date onward, for tz-naive or tz-aware indexes"""
+    start = pd.Timestamp(start)
+    if data.index.tz is not None:
+        start = start.tz_localize(data.index.tz)
+    return data[data.index >= start]
+
+
+def _stringify_keys(value):
+    """Convert dict keys (e.g. statement period Timestamps) to strings for JSON"""
+    if isinstance(value, dict):
+        return {str(key): _stringify_keys(item) for key, item in value.items()}
+    return value
+
+
+class FetchError(Exception):
+    """Structured failure from a market data provider.
+
+    reason is one of:
+    - 'no_data': the provider answered but has nothing for the symbol (delisted/renamed)
+    - 'network': the request kept failing after all retries
+    - 'circuit_open': the symbol is in the negative cache and was not requested
+    """
+
+    def __init__(self, stock_code, reason, message='', attempts=0):
+        super().__init__(f"{stock_code}: {reason}" + (f" ({message})" if message else ''))
+        self.stock_code = stock_code
+        self.reason = reason
+        self.message = message
+        self.attempts = attempts
+
+
+class SymbolCircuitBreaker:
+    """Negative cache for symbols that keep returning no data.
+
+    After failure_threshold consecutive failures a symbol is skipped until
+    cooldown_hours have passed; a success resets its failure count.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown_hours=24):
+        self.failure_threshold = failure_threshold
+        self.cooldown = timedelta(hours=cooldown_hours)
+        self.failures = {}  # stock_code -> consecutive failure count
+        self.open_until = {}  # stock_code -> datetime when the symbol may be retried
+        self.lock = threading.Lock()
+
+    def check(self, stock_code):
+        """Raise FetchError('circuit_open') while the symbol is in the negative cache"""
+        with self.lock:
+            until = self.open_until.get(stock_code)
+            if until is None:
+                return
+            if datetime.now() < until:
+                raise FetchError(stock_code, 'circuit_open', f"skipped until {until:%Y-%m-%d %H:%M}")
+
+            # Cooldown expired - allow one more attempt (a failure re-opens immediately)
+            del self.open_until[stock_code]
+            self.failures[stock_code] = self.failure_threshold - 1
+
+    def is_open(self, stock_code):
+        """Check whether the symbol is currently being skipped"""
+        try:
+            self.check(stock_code)
+            return False
+        except FetchError:
+            return True
+
+    def record_success(self, stock_code):
+        with self.lock:
+            self.failures.pop(stock_code, None)
+            self.open_until.pop(stock_code, None)
+
+    def record_failure(self, stock_code):
+        with self.lock:
+            count = self.failures.get(stock_code, 0) + 1
+            self.failures[stock_code] = count
+            if count >= self.failure_threshold:
+                self.open_until[stock_code] = datetime.now() + self.cooldown
+                print(f"{stock_code} failed {count} times in a row - skipping it for {self.cooldown}")
+
+
+class MarketDataProvider(ABC):
+    """Base class for market data sources used by the refresh pipeline"""
+
+    # Number of symbols requested together in one bulk download
+    bulk_chunk_size = 50
+
+    # HTTP requests made by one get_company_financials call, for rate limiting
+    financials_request_count = 1
+
+    @abstractmethod
+    def get_stock_data(self, stock_code, period='1y'):
+        """
+        Fetch OHLCV data for one stock
+        Returns: DataFrame indexed by date with Open/High/Low/Close/Volume
+        Raises: FetchError when the data cannot be fetched
+        """
+        pass
+
+    @abstractmethod
+    def get_fundamental_data(self, stock_code):
+        """
+        Fetch fundamental data for one stock
+        Returns: Dictionary of fundamental fields
+        Raises: FetchError when the data cannot be fetched
+        """
+        pass
+
+    @abstractmethod
+    def get_company_financials(self, stock_code):
+        """
+        Fetch financial statements for one stock
+        Returns: Dictionary with income_statement, balance_sheet and cash_flow (annual) and
+        their quarterly_ counterparts, each as {period_end: {line_item: value}}
+        Raises: FetchError when the data cannot be fetched
+        """
+        pass
+
+    def get_bulk_stock_data(self, stock_codes, period='1y', start=None):
+        """Fetch OHLCV data for many stocks (providers without a bulk API fetch one by one)
+        When start is given, only bars from that date onward are returned.
+        Returns: Dictionary of stock_code -> DataFrame, or FetchError for stocks that failed
+        """
+        results = {}
+        for stock_code in stock_codes:
+            try:
+                data = self.get_stock_data(stock_code, 'max' if start else period)
+                if start:
+                    data = _bars_since(data, start)
+                results[stock_code] = data
+            except FetchError as e:
+                results[stock_code] = e
+        return results
+
+    def get_lifetime_high(self, stock_code):
+        """Fetch the all-time high from the full price history
+        Returns: (lifetime_high, high_date)
+        Raises: FetchError when the history cannot be fetched
+        """
+        data = self.get_stock_data(stock_code, 'max')
+        return float(data['High'].max()), data['High'].idxmax().strftime('%Y-%m-%d')
+
+
+class LocalReplayProvider(MarketDataProvider):
+    """Offline provider serving recorded or synthetic market data from disk.
+
+    Recorded files live in data_dir as <code>.csv (OHLCV indexed by date),
+    <code>_fundamental.json and <code>_financials.json. Stocks without a
+    recording get deterministic synthetic data when synthetic=True.
+    latency (seconds per call) and failure_rate (probability of a call
+    failing with a 'network' FetchError) simulate a slow or flaky network.
+    """
+
+    def __init__(self, data_dir=os.path.join('data', 'replay'), latency=0.0, failure_rate=0.0,
+                 synthetic=True, synthetic_years=10, seed=None):
+        self.data_dir = data_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.synthetic = synthetic
+        self.synthetic_years = synthetic_years
+        self.random = random.Random(seed)
+        self._history_cache = {}
+
+    def _simulate_network(self, stock_code):
+        """Apply configured latency and failure injection to one call"""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise FetchError(stock_code, 'network', 'injected failure', attempts=1)
+
+    def _load_history(self, stock_code):
+        """Load the full recorded (or synthetic) history for a stock"""
+        if stock_code in self._history_cache:
+            return self._history_cache[stock_code]
+
+        filepath = os.path.join(self.data_dir, f"{stock_code}.csv")
+        if os.path.exists(filepath):
+            data = pd.read_csv(filepath, index_col=0, parse_dates=True)
+            # Recordings keep Yahoo's exchange-local timestamps (e.g. +05:30); serve them as
+            # tz-naive dates and only the OHLCV columns
+            index = pd.DatetimeIndex(data.index, name='Date')
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            data = data[['Open', 'High', 'Low', 'Close', 'Volume']].set_axis(index)
+        elif self.synthetic:
+            data = self._synthetic_history(stock_code)
+        else:
+            data = pd.DataFrame()
+
+        self._history_cache[stock_code] = data
+        return data
+
+    def _synthetic_history(self, stock_code):
+        """Generate a deterministic random-walk OHLCV history for a stock"""
+        rng = np.random.default_rng(zlib.crc32(stock_code.encode()))
+        end = pd.Timestamp(datetime.now().date())
+        dates = pd.bdate_range(end=end, periods=self.synthetic_years * 252)
+
+        start_price = rng.uniform(50, 3000)
+        returns = rng.normal(0.0004, 0.018, len(dates))
+        close = start_price * np.exp(np.cumsum(returns))
+        open_price = close * np.exp(rng.normal(0, 0.005, len(dates)))
+        high = np.maximum(open_price, close) * (1 + np.abs(rng.normal(0, 0.008, len(dates))))
+        low = np.minimum(open_price, close) * (1 - np.abs(rng.normal(0, 0.008, len(dates))))
+        volume = rng.integers(10_000, 5_000_000, len(dates))
+
+        return pd.DataFrame({
+            'Open': open_price,
+            'High': high,
+            'Low': low,
+            'Close': close,
+            'Volume': volume
+        }, index=pd.DatetimeIndex(dates, name='Date'))
+
+    def _load_json(self, stock_code, suffix):
+        """Load a recorded JSON document for a stock (None if not recorded)"""
+        filepath = os.path.join(self.data_dir, f"{stock_code}_{suffix}.json")
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'r') as f:
+            return json.load(f)
+
+    def get_stock_data(self, stock_code, period='1y'):
+        """Serve OHLCV data for a period, measured back from the latest recorded bar"""
+        self._simulate_network(stock_code)
+
+        data = self._load_history(stock_code)
+        if data.empty:
+            raise FetchError(stock_code, 'no_data', 'no recording')
+
+        offset = PERIOD_OFFSETS.get(period)
+        if offset is not None:
+            data = data[data.index >= data.index[-1] - offset]
+        return data.copy()
+
+    def get_bulk_stock_data(self, stock_codes, period='1y', start=None):
+        """Serve many stocks as one simulated round-trip per chunk of symbols"""
+        results = {}
+        for offset in range(0, len(stock_codes), self.bulk_chunk_size):
+            chunk = stock_codes[offset:offset + self.bulk_chunk_size]
+            try:
+                self._simulate_network(chunk[0])
+            except FetchError as e:
+                results.update({stock_code: FetchError(stock_code, e.reason, e.message, e.attempts)
+                                for stock_code in chunk})
+                continue
+
+            for stock_code in chunk:
+                data = self._load_history(stock_code)
+                if data.empty:
+                    results[stock_code] = FetchError(stock_code, 'no_data', 'no recording')
+                    continue
+
+                if start:
+                    data = _bars_since(data, start)
+                else:
+                    period_offset = PERIOD_OFFSETS.get(period)
+                    if period_offset is not None:
+                        data = data[data.index >= data.index[-1] - period_offset]
+                results[stock_code] = data.copy()
+        return results
+
+    def get_fundamental_data(self, stock_code):
+        """Serve recorded (or synthetic) fundamental data"""
+        self._simulate_network(stock_code)
+
+        fundamental_data = self._load_json(stock_code, 'fundamental')
+        if fundamental_data is not None:
+            return fundamental_data
+        if not self.synthetic:
+            raise FetchError(stock_code, 'no_data', 'no recording')
+
+        history = self._load_history(stock_code)
+        last_year = history.tail(252)
+        rng = np.random.default_rng(zlib.crc32(f"{stock_code}_fundamental".encode()))
+        return {
+            'company_name': f"{stock_code} Ltd (synthetic)",
+            'industry_sector': 'Synthetic',
+            'industry': 'Synthetic',
+            'current_price': float(history['Close'].iloc[-1]),
+            'pe_ratio': float(rng.uniform(5, 80)),
+            'debt_to_equity': float(rng.uniform(0, 150)),
+            'week_52_high': float(last_year['High'].max()),
+            'week_52_low': float(last_year['Low'].min()),
+            'market_cap': int(rng.uniform(1e9, 1e13)),
+            'book_value': float(rng.uniform(10, 1000)),
+            'dividend_yield': float(rng.uniform(0, 0.05)),
+            'beta': float(rng.uniform(0.5, 1.8)),
+            'earnings_growth': float(rng.normal(0.12, 0.15)),
+            'revenue_growth': float(rng.normal(0.10, 0.10)),
+            'profit_margins': float(rng.uniform(0.02, 0.35)),
+            'operating_margins': float(rng.uniform(0.05, 0.40)),
+            'return_on_equity': float(rng.uniform(0.02, 0.35)),
+            'return_on_assets': float(rng.uniform(0.01, 0.20)),
+            'current_ratio': float(rng.uniform(0.5, 3.0)),
+            'quick_ratio': float(rng.uniform(0.3, 2.5)),
+            'business_summary': 'Synthetic company generated for offline testing',
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def get_company_financials(self, stock_code):
+        """Serve recorded (or synthetic quarterly income) financial statements"""
+        self._simulate_network(stock_code)
+
+        financials = self._load_json(stock_code, 'financials')
+        if financials is not None:
+            return financials
+        if not self.synthetic:
+            raise FetchError(stock_code, 'no_data', 'no recording')
+
+        # Eight quarters of steadily growing revenue and profit, ending with the last full quarter
+        rng = np.random.default_rng(zlib.crc32(f"{stock_code}_financials".encode()))
+        quarter_ends = pd.date_range(end=pd.Timestamp(datetime.now().date()) - pd.offsets.QuarterEnd(),
+                                     periods=8, freq='QE')
+        revenue = rng.uniform(1e9, 1e11) * np.cumprod(1 + rng.normal(0.03, 0.05, len(quarter_ends)))
+        net_income = revenue * rng.uniform(0.05, 0.25)
+        quarterly_income = {
+            period_end.strftime('%Y-%m-%d'): {'Total Revenue': float(rev), 'Net Income': float(income)}
+            for period_end, rev, income in zip(quarter_ends, revenue, net_income)
+        }
+        return {
+            'income_statement': {},
+            'balance_sheet': {},
+            'cash_flow': {},
+            'quarterly_income_statement': quarterly_income,
+            'quarterly_balance_sheet': {},
+            'quarterly_cash_flow': {}
+        }
+
+    def record(self, provider, stock_codes, period='max'):
+        """Record history, fundamentals and financials from another provider for later replay"""
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        for stock_code in stock_codes:
+            try:
+                data = provider.get_stock_data(stock_code, period)
+                if not data.empty:
+                    data.to_csv(os.path.join(self.data_dir, f"{stock_code}.csv"))
+                    self._history_cache.pop(stock_code, None)
+
+                for suffix, fetch in [('fundamental', provider.get_fundamental_data),
+                                      ('financials', provider.get_company_financials)]:
+                    document = fetch(stock_code)
+                    if document:
+                        with open(os.path.join(self.data_dir, f"{stock_code}_{suffix}.json"), 'w') as f:
+                            json.dump(_stringify_keys(document), f, default=str)
+
+                print(f"Recorded market data for {stock_code}")
+            except Exception as e:
+                print(f"Error recording market data for {stock_code}: {e}")
@@ -0,0 +1,186 @@
+import os
+import shutil
+import uuid
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+
+# Column files of one stock's history: name -> (file name, dtype)
+COLUMN_FILES = {
+    'date': ('date.i4', np.int32),  # Days since 1970-01-01
+    'Open': ('open.f8', np.float64),
+    'High': ('high.f8', np.float64),
+    'Low': ('low.f8', np.float64),
+    'Close': ('close.f8', np.float64),
+    'Volume': ('volume.i8', np.int64)
+}
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _differs(stored, new):
+    """Element-wise inequality that treats two NaNs as equal"""
+    differs = stored != new
+    if stored.dtype.kind == 'f':
+        differs &= ~(np.isnan(stored) & np.isnan(new))
+    return differs
+
+
+class ColumnarPriceStore:
+    """Per-stock OHLCV history kept as memory-mapped, typed column files.
+
+    Layout: <root>/<stock_code>/current is a symlink to a generation directory holding one
+    raw file per column. Reads map the files read-only, so several processes share the OS
+    page cache and slices are views rather than copies.
+
+    New bars are appended to the current generation: value columns first and the date
+    column last, so the date file's length is always the number of complete bars. Any other
+    change (revised values, missing or reordered dates, full history) writes a new generation
+    and swaps the symlink atomically; stored bars are never modified in place, so readers
+    holding the old files keep a consistent view.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _stock_dir(self, stock_code):
+        return os.path.join(self.root, quote(stock_code, safe=''))
+
+    def _current_dir(self, stock_code):
+        current = os.path.join(self._stock_dir(stock_code), 'current')
+        return os.path.realpath(current) if os.path.islink(current) else None
+
+    def stock_codes(self):
+        """Get the stock codes that have stored history"""
+        return [unquote(name) for name in os.listdir(self.root)
+                if os.path.islink(os.path.join(self.root, name, 'current'))]
+
+    def _map(self, generation_dir):
+        """Map a generation's columns, trimmed to the number of complete bars"""
+        dates = self._map_file(generation_dir, 'date')
+        columns = {}
+        for field in PRICE_FIELDS:
+            columns[field] = self._map_file(generation_dir, field)[:len(dates)]
+        return dates, columns
+
+    def _map_file(self, generation_dir, column):
+        file_name, dtype = COLUMN_FILES[column]
+        path = os.path.join(generation_dir, file_name)
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def read(self, stock_code, start_day=None):
+        """Get a stock's bars from start_day onward as read-only array views.
+        Returns: (epoch days, {field: values}) or None when the stock has no history
+        """
+        for attempt in range(3):
+            generation_dir = self._current_dir(stock_code)
+            if generation_dir is None:
+                return None
+            try:
+                dates, columns = self._map(generation_dir)
+                break
+            except FileNotFoundError:
+                continue  # A new generation replaced this one while it was being opened
+        else:
+            return None
+
+        start = int(np.searchsorted(dates, start_day)) if start_day is not None else 0
+        return dates[start:], {field: values[start:] for field, values in columns.items()}
+
+    def latest_day(self, stock_code):
+        """Get the epoch day of a stock's latest bar (None without history)"""
+        stored = self.read(stock_code)
+        if stored is None or len(stored[0]) == 0:
+            return None
+        return int(stored[0][-1])
+
+    def write(self, stock_code, days, columns, full_history=False):
+        """Store bars for a stock. days must be sorted epoch days and columns the matching values.
+        Without full_history, stored bars before the first new day are kept.
+        Returns: Dictionary of inserted/updated/unchanged/deleted bar counts
+        """
+        days = np.asarray(days, dtype=np.int32)
+        columns = {field: np.asarray(columns[field], dtype=COLUMN_FILES[field][1]) for field in PRICE_FIELDS}
+
+        generation_dir = self._current_dir(stock_code)
+        if generation_dir is None:
+            self._write_generation(stock_code, days, columns)
+            return {'inserted': len(days), 'updated': 0, 'unchanged': 0, 'deleted': 0}
+
+        stored_days, stored_columns = self._map(generation_dir)
+        first = 0 if full_history else int(np.searchsorted(stored_days, days[0]))
+        covered_days = stored_days[first:]
+
+        overlap = len(covered_days)
+        if overlap <= len(days) and np.array_equal(covered_days, days[:overlap]):
+            changed = np.zeros(overlap, dtype=bool)
+            for field in PRICE_FIELDS:
+                changed |= _differs(stored_columns[field][first:], columns[field][:overlap])
+            if not changed.any():
+                # Stored bars are an unchanged prefix of the new ones: append the rest
+                self._append(generation_dir, len(stored_days), days[overlap:],
+                             {field: values[overlap:] for field, values in columns.items()})
+                return {'inserted': len(days) - overlap, 'updated': 0, 'unchanged': overlap, 'deleted': 0}
+
+        # Stored bars changed - rewrite the whole series as a new generation
+        kept_days = stored_days[:first]
+        merged_days = np.concatenate([kept_days, days])
+        merged_columns = {field: np.concatenate([stored_columns[field][:first], columns[field]])
+                          for field in PRICE_FIELDS}
+
+        common, stored_positions, new_positions = np.intersect1d(covered_days, days, assume_unique=True,
+                                                                 return_indices=True)
+        changed = np.zeros(len(common), dtype=bool)
+        for field in PRICE_FIELDS:
+            changed |= _differs(stored_columns[field][first:][stored_positions], columns[field][new_positions])
+        counts = {
+            'inserted': len(days) - len(common),
+            'updated': int(changed.sum()),
+            'unchanged': len(common) - int(changed.sum()),
+            'deleted': len(covered_days) - len(common)
+        }
+
+        self._write_generation(stock_code, merged_days, merged_columns)
+        return counts
+
+    def _append(self, generation_dir, complete_rows, days, columns):
+        """Append bars to a generation, truncating any partial append left by a crash"""
+        if len(days) == 0:
+            return
+        for field in PRICE_FIELDS:
+            file_name, dtype = COLUMN_FILES[field]
+            with open(os.path.join(generation_dir, file_name), 'r+b') as f:
+                f.truncate(complete_rows * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(columns[field].tobytes())
+        # The date column goes last: it marks the appended bars as complete
+        with open(os.path.join(generation_dir, COLUMN_FILES['date'][0]), 'ab') as f:
+            f.write(days.tobytes())
+
+    def _write_generation(self, stock_code, days, columns):
+        """Write a complete new generation and atomically make it current"""
+        stock_dir = self._stock_dir(stock_code)
+        os.makedirs(stock_dir, exist_ok=True)
+        previous_dir = self._current_dir(stock_code)
+
+        generation = f'gen-{uuid.uuid4().hex}'
+        generation_dir = os.path.join(stock_dir, generation)
+        os.makedirs(generation_dir)
+        for column, values in [('date', days)] + [(field, columns[field]) for field in PRICE_FIELDS]:
+            with open(os.path.join(generation_dir, COLUMN_FILES[column][0]), 'wb') as f:
+                f.write(values.tobytes())
+
+        link = os.path.join(stock_dir, f'current-{generation}')
+        os.symlink(generation, link)
+        os.replace(link, os.path.join(stock_dir, 'current'))
+
+        # Readers that already mapped the old files keep them until they unmap
+        if previous_dir:
+            shutil.rmtree(previous_dir, ignore_errors=True)
+
+    def delete(self, stock_code):
+        """Remove a stock's stored history"""
+        shutil.rmtree(self._stock_dir(stock_code), ignore_errors=True)
@@ -0,0 +1,522 @@
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from market_data_provider import FetchError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all refresh workers to stay under Yahoo's rate limits"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)  # Tokens added per second
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until the requested number of tokens has been taken.
+        More tokens than the bucket holds are taken in parts as it refills.
+        """
+        while tokens > 0:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+
+                part = min(tokens, self.capacity)
+                if self.tokens >= part:
+                    self.tokens -= part
+                    tokens -= part
+                    continue
+                wait_time = (part - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+class RefreshJob:
+    """Progress of one background refresh run.
+    The process running it saves its progress to the refresh_jobs table, so every app
+    process can report it; from_record() rebuilds a job from a saved record.
+    """
+
+    def __init__(self, stock_codes, mode, force_fundamentals=False):
+        self.job_id = uuid.uuid4().hex
+        self.mode = mode
+        self.force_fundamentals = force_fundamentals
+        self.status = 'running'
+        self.total = len(stock_codes)
+        self.done = 0
+        self.success_count = 0
+        self.skipped_count = 0
+        self.error_count = 0
+        self.current_symbol = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.rows = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild a job from its refresh_jobs record"""
+        job = cls((), record['mode'], bool(record['force_fundamentals']))
+        for name in ['job_id', 'status', 'total', 'done', 'success_count', 'skipped_count', 'error_count',
+                     'current_symbol', 'started_at', 'finished_at', 'error']:
+            setattr(job, name, record[name])
+        job.rows = json.loads(record['rows_json']) if record['rows_json'] else None
+        return job
+
+    def to_record(self):
+        """The job's refresh_jobs record, stamped with the current time"""
+        with self.lock:
+            return {
+                'job_id': self.job_id,
+                'mode': self.mode,
+                'force_fundamentals': int(self.force_fundamentals),
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'success_count': self.success_count,
+                'skipped_count': self.skipped_count,
+                'error_count': self.error_count,
+                'current_symbol': self.current_symbol,
+                'rows_json': json.dumps(self.rows) if self.rows else None,
+                'error': self.error,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'updated_at': time.time()
+            }
+
+    def record(self, stock_code, outcome):
+        """Record one finished stock (used as the engine's progress callback)"""
+        with self.lock:
+            self.done += 1
+            self.current_symbol = stock_code
+            if outcome == 'success':
+                self.success_count += 1
+            elif outcome == 'error':
+                self.error_count += 1
+            else:
+                self.skipped_count += 1
+
+    def finish(self, result=None, error=None):
+        """Mark the job as completed (or failed with an error message)"""
+        with self.lock:
+            self.rows = result['rows'] if result else None
+            self.error = error
+            self.status = 'failed' if error else 'completed'
+            self.finished_at = time.time()
+
+    @property
+    def is_running(self):
+        return self.status == 'running'
+
+    def to_dict(self):
+        """Snapshot of the job's progress for the status API"""
+        with self.lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if self.is_running and self.done > 0:
+                eta = elapsed / self.done * (self.total - self.done)
+            else:
+                eta = 0 if not self.is_running else None
+
+            return {
+                'job_id': self.job_id,
+                'status': self.status,
+                'mode': self.mode,
+                'force_fundamentals': self.force_fundamentals,
+                'done': self.done,
+                'total': self.total,
+                'current_symbol': self.current_symbol,
+                'success_count': self.success_count,
+                'skipped_count': self.skipped_count,
+                'error_count': self.error_count,
+                'elapsed': round(elapsed, 1),
+                'eta': round(eta, 1) if eta is not None else None,
+                'rows': self.rows,
+                'error': self.error
+            }
+
+
+class RefreshEngine:
+    """Refresh stock data with concurrent Yahoo fetches and a single SQLite writer.
+
+    Workers only talk to the network; every database write is queued to one
+    writer thread, which also decides each stock's outcome once its price
+    history and fundamentals have both been handled.
+    """
+
+    def __init__(self, data_manager, market_client, workers=8, requests_per_second=4.0,
+                 history_period='2y', delta_overlap_days=7, fundamentals_ttl_hours=168,
+                 financials_recheck_days=7):
+        self.data_manager = data_manager
+        self.market_client = market_client
+        self.workers = max(1, int(workers))
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.history_period = history_period
+        # Incremental refreshes re-fetch this many calendar days before the latest stored bar,
+        # so the overlap can be checked against stored closes for split/dividend adjustments
+        self.delta_overlap_days = delta_overlap_days
+        # Fundamentals saved more recently than this are not fetched again unless forced
+        self.fundamentals_ttl = timedelta(hours=fundamentals_ttl_hours)
+        # Financial statements are only fetched once a new quarter is due, and a stock whose
+        # new quarter has not been published yet is re-checked at most this often
+        self.financials_recheck_days = financials_recheck_days
+
+        # Background jobs: at most one runs at a time across all app processes. The running job
+        # saves its progress every job_heartbeat_seconds; one silent for job_stale_seconds is dead
+        self.current_job = None
+        self.jobs_lock = threading.Lock()
+        self.max_finished_jobs = 20
+        self.job_heartbeat_seconds = 1.0
+        self.job_stale_seconds = 60
+
+    def start_job(self, stock_codes, mode='incremental', force_fundamentals=False):
+        """Start a background refresh, or attach to the one already running in any app process.
+        Returns: (job, started) where started is False when an existing job was returned
+        """
+        job = RefreshJob(stock_codes, mode, force_fundamentals)
+        record, claimed = self.data_manager.claim_refresh_job(job.to_record(), self.job_stale_seconds,
+                                                              self.max_finished_jobs)
+        if not claimed:
+            if record is None:
+                raise RuntimeError('Could not record the refresh job')
+            return self._job_from_record(record), False
+
+        with self.jobs_lock:
+            self.current_job = job
+
+        thread = threading.Thread(target=self._run_job, args=(job, stock_codes),
+                                  name=f'refresh-job-{job.job_id[:8]}', daemon=True)
+        thread.start()
+        return job, True
+
+    def get_job(self, job_id=None):
+        """Get a job by id, or the most recent job when no id is given"""
+        record = self.data_manager.get_refresh_job(job_id)
+        return self._job_from_record(record) if record else None
+
+    def _job_from_record(self, record):
+        """The job of a saved record, using the live job when this process is running it"""
+        with self.jobs_lock:
+            if self.current_job and self.current_job.job_id == record['job_id']:
+                return self.current_job
+        return RefreshJob.from_record(record)
+
+    def _run_job(self, job, stock_codes):
+        """Job thread body: run the refresh and record its result on the job.
+        A heartbeat thread saves the job's progress meanwhile.
+        """
+        stopped = threading.Event()
+
+        def save_progress():
+            while not stopped.wait(self.job_heartbeat_seconds):
+                self.data_manager.update_refresh_job(job.to_record())
+
+        heartbeat = threading.Thread(target=save_progress, name=f'refresh-heartbeat-{job.job_id[:8]}', daemon=True)
+        heartbeat.start()
+        try:
+            result = self.run(stock_codes, mode=job.mode, on_progress=job.record,
+                              force_fundamentals=job.force_fundamentals)
+            job.finish(result=result)
+        except Exception as e:
+            logger.error(f"Critical refresh error in job {job.job_id}: {e}")
+            job.finish(error=str(e))
+        finally:
+            stopped.set()
+            heartbeat.join()
+            self.data_manager.update_refresh_job(job.to_record())
+
+    def run(self, stock_codes, mode='incremental', on_progress=None, force_fundamentals=False):
+        """Refresh the given stocks.
+        mode='full' re-downloads every stock's history instead of only new bars.
+        force_fundamentals refetches fundamentals even when they are within the freshness TTL.
+        on_progress(stock_code, outcome) is called from the writer thread as each stock finishes.
+        Returns: Dictionary with success/skipped/error counts, per-stock outcomes,
+        per-stock fetch error reasons, inserted/updated/unchanged/deleted bar counts and duration
+        """
+        start_time = time.time()
+        result = {
+            'success_count': 0,
+            'skipped_count': 0,
+            'error_count': 0,
+            'outcomes': {},
+            'fetch_errors': {},
+            'rows': {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0},
+            'duration': 0
+        }
+
+        latest_dates = self.data_manager.get_latest_dates() if mode != 'full' else {}
+        # Max history is only downloaded for stocks whose lifetime high was never seeded
+        seeded_highs = self.data_manager.get_seeded_lifetime_high_codes()
+        fresh_fundamentals = set() if force_fundamentals else self._get_fresh_fundamentals()
+        financials_due = set(self.data_manager.get_financials_due(stock_codes, self.financials_recheck_days))
+        chunk_size = self.market_client.bulk_chunk_size
+        writes = queue.Queue()
+
+        writer = threading.Thread(target=self._write_loop, args=(stock_codes, writes, result, on_progress),
+                                  name='refresh-writer', daemon=True)
+        writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='refresh-worker') as executor:
+                for chunk_start in range(0, len(stock_codes), chunk_size):
+                    chunk = stock_codes[chunk_start:chunk_start + chunk_size]
+                    executor.submit(self._fetch_history, chunk, latest_dates, writes)
+
+                for stock_code in stock_codes:
+                    fetch_fundamentals = stock_code not in fresh_fundamentals
+                    seed_lifetime_high = stock_code not in seeded_highs
+                    fetch_financials = stock_code in financials_due
+                    if fetch_fundamentals or seed_lifetime_high or fetch_financials:
+                        executor.submit(self._fetch_fundamentals, stock_code, writes,
+                                        fetch_fundamentals, seed_lifetime_high, fetch_financials)
+                    else:
+                        # Still fresh - nothing to fetch for this part
+                        writes.put((stock_code, 'fundamentals', ({}, (None, None), None), None))
+        finally:
+            # All workers are done; let the writer drain the queue and stop
+            writes.put(None)
+            writer.join()
+
+        result['duration'] = round(time.time() - start_time, 2)
+        logger.info(
+            f"Refresh completed: {result['success_count']} success, {result['error_count']} errors, "
+            f"{result['skipped_count']} skipped in {result['duration']}s "
+            f"(bars: {result['rows']['inserted']} new, {result['rows']['updated']} revised, "
+            f"{result['rows']['unchanged']} unchanged, {result['rows']['deleted']} removed)")
+        return result
+
+    def _fetch_history(self, stock_codes, latest_dates, writes):
+        """Fetch price history for a chunk of stocks and queue it for writing.
+        Stocks listed in latest_dates only fetch bars from shortly before their latest
+        stored date. Stocks without history, or whose stored history no longer matches
+        Yahoo's adjusted prices, get a full download of the history period.
+        """
+        try:
+            full_codes = [code for code in stock_codes if code not in latest_dates]
+            adjusted = set()  # Stored history no longer matches - the lifetime high must be re-seeded
+
+            # Group stocks by delta start date so each group is one bulk request
+            codes_by_start = {}
+            for stock_code in stock_codes:
+                if stock_code in latest_dates:
+                    start = pd.Timestamp(latest_dates[stock_code]) - pd.Timedelta(days=self.delta_overlap_days)
+                    codes_by_start.setdefault(start.strftime('%Y-%m-%d'), []).append(stock_code)
+
+            # yfinance makes one HTTP request per symbol of a bulk download, so each symbol costs a token
+            for start, codes in codes_by_start.items():
+                self.rate_limiter.acquire(len(codes))
+                delta_data = self.market_client.get_bulk_stock_data(codes, start=start)
+                for stock_code in codes:
+                    stock_data = delta_data.get(stock_code, pd.DataFrame())
+                    if isinstance(stock_data, FetchError):
+                        writes.put((stock_code, 'history', None, stock_data))
+                    elif self.data_manager.is_history_stale(stock_code, stock_data):
+                        full_codes.append(stock_code)
+                        adjusted.add(stock_code)
+                    else:
+                        writes.put((stock_code, 'history', (stock_data, False, False), None))
+
+            if full_codes:
+                self.rate_limiter.acquire(len(full_codes))
+                full_data = self.market_client.get_bulk_stock_data(full_codes, self.history_period)
+                for stock_code in full_codes:
+                    stock_data = full_data.get(stock_code, pd.DataFrame())
+                    if isinstance(stock_data, FetchError):
+                        writes.put((stock_code, 'history', None, stock_data))
+                    else:
+                        writes.put((stock_code, 'history', (stock_data, True, stock_code in adjusted), None))
+
+        except Exception as e:
+            logger.error(f"Error fetching data for chunk starting at {stock_codes[0]}: {e}")
+            # The writer ignores reports for stocks whose history was already queued
+            for stock_code in stock_codes:
+                writes.put((stock_code, 'history', None, FetchError(stock_code, 'network', str(e))))
+
+    def _get_fresh_fundamentals(self):
+        """Get the stock codes whose saved fundamentals are still within the freshness TTL"""
+        cutoff = datetime.now() - self.fundamentals_ttl
+        last_updated = self.data_manager.get_fundamentals_last_updated()
+        return {stock_code for stock_code, updated in last_updated.items() if updated >= cutoff}
+
+    def _fetch_fundamentals(self, stock_code, writes, fetch_fundamentals=True, seed_lifetime_high=False,
+                            fetch_financials=False):
+        """Fetch fundamental data, the lifetime high seed and/or financial statements for one stock
+        and queue them for writing"""
+        fundamental_data = {}
+        error = None
+        if fetch_fundamentals:
+            try:
+                self.rate_limiter.acquire()
+                fundamental_data = self.market_client.get_fundamental_data(stock_code)
+            except FetchError as e:
+                error = e
+            except Exception as e:
+                error = FetchError(stock_code, 'network', str(e))
+
+        # A failed seed is simply retried on the next refresh
+        lifetime_high = (None, None)
+        if seed_lifetime_high:
+            try:
+                self.rate_limiter.acquire()
+                lifetime_high = self.market_client.get_lifetime_high(stock_code)
+            except Exception as e:
+                logger.warning(f"Error fetching lifetime high for {stock_code}: {e}")
+
+        # Financial statements: None leaves the stock due, an empty dict records the check
+        financials = None
+        if fetch_financials:
+            try:
+                self.rate_limiter.acquire(self.market_client.financials_request_count)
+                financials = self.market_client.get_company_financials(stock_code)
+            except FetchError as e:
+                if e.reason == 'no_data':
+                    financials = {}
+                else:
+                    logger.warning(f"Error fetching financial statements for {stock_code}: {e}")
+            except Exception as e:
+                logger.warning(f"Error fetching financial statements for {stock_code}: {e}")
+
+        writes.put((stock_code, 'fundamentals', (fundamental_data, lifetime_high, financials), error))
+
+    def _save_history_batch(self, batch, pending_parts, seeded):
+        """Write every pending price history in a batch of queued items in one transaction.
+        Adjusted histories reset the stored lifetime high, unless it was seeded earlier in
+        this run (the seed already reflects the adjustment).
+        Returns: Dictionary of stock_code -> row counts of the save, or None if it failed
+        """
+        frames = {}
+        full_history_codes = set()
+        reset_high_codes = set()
+        for stock_code, part, payload, error in batch:
+            parts = pending_parts.get(stock_code)
+            if part != 'history' or payload is None or parts is None or part not in parts:
+                continue
+            stock_data, full_history, adjusted = payload
+            if stock_data.empty or stock_code in frames:
+                continue
+            frames[stock_code] = stock_data
+            if full_history:
+                full_history_codes.add(stock_code)
+            if adjusted and stock_code not in seeded:
+                reset_high_codes.add(stock_code)
+
+        if not frames:
+            return {}
+        saved = self.data_manager.save_bulk_stock_data(frames, full_history_codes=full_history_codes,
+                                                       reset_high_codes=reset_high_codes)
+        if saved:
+            return saved
+
+        # The batch was rolled back - save stocks one by one so a bad frame only fails its own stock
+        return {stock_code: self.data_manager.save_stock_data(stock_code, stock_data,
+                                                              full_history=stock_code in full_history_codes,
+                                                              reset_lifetime_high=stock_code in reset_high_codes)
+                for stock_code, stock_data in frames.items()}
+
+    def _write_loop(self, stock_codes, writes, result, on_progress):
+        """Single writer: apply queued results to the database and record per-stock outcomes"""
+        pending_parts = {stock_code: {'history', 'fundamentals'} for stock_code in stock_codes}
+        updated = set()
+        failed = set()
+        seeded = set()  # Stocks whose lifetime high was seeded in this run
+        fetch_errors = {}  # stock_code -> list of FetchError reasons
+        total_stocks = len(stock_codes)
+
+        stopping = False
+        while not stopping:
+            # Take everything queued so far as one batch
+            batch = [writes.get()]
+            while True:
+                try:
+                    batch.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+
+            history_saved = self._save_history_batch(batch, pending_parts, seeded)
+
+            for stock_code, part, payload, error in batch:
+                parts = pending_parts.get(stock_code)
+                if parts is None or part not in parts:
+                    continue  # Duplicate report for a part that was already handled
+
+                try:
+                    if error is not None:
+                        fetch_errors.setdefault(stock_code, []).append(f"{part}: {error.reason}")
+                        logger.warning(f"Could not fetch {part} for {stock_code}: {error}")
+                        # Only network failures count as errors; missing or skipped symbols have no new data
+                        if error.reason == 'network':
+                            failed.add(stock_code)
+
+                    if part == 'history' and payload is not None:
+                        if stock_code in history_saved:
+                            row_counts = history_saved.pop(stock_code)
+                            if row_counts is None:
+                                failed.add(stock_code)
+                            else:
+                                for key, count in row_counts.items():
+                                    result['rows'][key] += count
+                                # Re-saving bars that are already stored is no new data
+                                if row_counts['inserted'] or row_counts['updated'] or row_counts['deleted']:
+                                    updated.add(stock_code)
+                        else:
+                            logger.warning(f"No data returned for {stock_code}")
+                    elif part == 'fundamentals' and payload is not None:
+                        fundamental_data, (lifetime_high, high_date), financials = payload
+                        if fundamental_data:
+                            if self.data_manager.save_fundamental_data(stock_code, fundamental_data):
+                                updated.add(stock_code)
+                            else:
+                                failed.add(stock_code)
+                        if lifetime_high is not None:
+                            if self.data_manager.save_lifetime_high(stock_code, lifetime_high, high_date):
+                                seeded.add(stock_code)
+                        if financials is not None:
+                            self.data_manager.save_financial_statements(stock_code, financials)
+                except Exception as e:
+                    logger.error(f"Error saving {part} for {stock_code}: {e}")
+                    failed.add(stock_code)
+
+                parts.discard(part)
+                if parts:
+                    continue
+
+                # Both parts handled - decide the stock's outcome
+                if stock_code in updated:
+                    outcome = 'success'
+                    result['success_count'] += 1
+                elif stock_code in failed:
+                    outcome = 'error'
+                    result['error_count'] += 1
+                else:
+                    outcome = 'skipped'
+                    result['skipped_count'] += 1
+                    logger.warning(f"No data updated for {stock_code}")
+                result['outcomes'][stock_code] = outcome
+                if stock_code in fetch_errors:
+                    result['fetch_errors'][stock_code] = fetch_errors.pop(stock_code)
+
+                done = len(result['outcomes'])
+                if done % 10 == 0 or done == total_stocks:
+                    logger.info(f"Processed stock {done}/{total_stocks}: {stock_code}")
+
+                if on_progress:
+                    try:
+                        on_progress(stock_code, outcome)
+                    except Exception as e:
+                        logger.error(f"Error in refresh progress callback: {e}")
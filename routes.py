@@ -6,6 +6,8 @@ from flask import render_template, request, redirect, url_for, flash, jsonify
 from app import app
 from data_manager import DataManager
 from yahoo_finance_client import YahooFinanceClient
+from market_data_provider import LocalReplayProvider
+from refresh_engine import RefreshEngine
 from strategies.simple_moving_average import SimpleMovingAverageStrategy
 from strategies.v20_strategy import V20Strategy
 from strategies.range_bound_trading import RangeBoundTradingStrategy
@@ -14,14 +16,57 @@ from strategies.cup_with_handle import CupWithHandleStrategy
 from strategies.v10_strategy import V10Strategy
 from strategies.lifetime_high_strategy import LifetimeHighStrategy
 from strategies.week_low_strategy import WeekLowStrategy
+from strategies.indicators import IndicatorContext
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# Canonical history downloaded per stock; period views are sliced from it at read time
+HISTORY_PERIOD = os.environ.get('STOCK_HISTORY_PERIOD', '2y')
+
+# Market data source: 'yahoo' (live) or 'replay' (offline recorded/synthetic data for load tests)
+MARKET_DATA_PROVIDER = os.environ.get('MARKET_DATA_PROVIDER', 'yahoo')
+
+# Refresh concurrency: worker threads for Yahoo fetches and a shared request rate limit
+REFRESH_WORKERS = int(os.environ.get('REFRESH_WORKERS', '8'))
+REFRESH_REQUESTS_PER_SECOND = float(os.environ.get('REFRESH_REQUESTS_PER_SECOND', '4'))
+
+# Fundamentals younger than this are skipped by refresh unless force_fundamentals is set
+FUNDAMENTALS_TTL_HOURS = float(os.environ.get('FUNDAMENTALS_TTL_HOURS', '168'))
+# How often to re-check a stock whose next quarterly statement has not been published yet
+FINANCIALS_RECHECK_DAYS = int(os.environ.get('FINANCIALS_RECHECK_DAYS', '7'))
+
+# SQLite connection settings (see DEFAULT_PRAGMAS in data_manager for the defaults)
+SQLITE_PRAGMAS = {
+    name: os.environ[f'SQLITE_{name.upper()}']
+    for name in ['journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout']
+    if f'SQLITE_{name.upper()}' in os.environ
+}
+
+# Memory budget for recently loaded price frames (0 disables the cache)
+FRAME_CACHE_MB = float(os.environ.get('FRAME_CACHE_MB', '64'))
+
+# Price history storage: 'sqlite' (stock_data table) or 'columnar' (memory-mapped column files)
+PRICE_BACKEND = os.environ.get('PRICE_BACKEND', 'sqlite')
+
 # Initialize managers
-data_manager = DataManager()
-yahoo_client = YahooFinanceClient()
+data_manager = DataManager(pragmas=SQLITE_PRAGMAS, frame_cache_bytes=int(FRAME_CACHE_MB * 1024 * 1024),
+                           price_backend=PRICE_BACKEND)
+if MARKET_DATA_PROVIDER == 'replay':
+    market_client = LocalReplayProvider(
+        data_dir=os.environ.get('REPLAY_DATA_DIR', os.path.join('data', 'replay')),
+        latency=float(os.environ.get('REPLAY_LATENCY', '0')),
+        failure_rate=float(os.environ.get('REPLAY_FAILURE_RATE', '0'))
+    )
+else:
+    market_client = YahooFinanceClient()
+refresh_engine = RefreshEngine(data_manager, market_client,
+                               workers=REFRESH_WORKERS,
+                               requests_per_second=REFRESH_REQUESTS_PER_SECOND,
+                               history_period=HISTORY_PERIOD,
+                               fundamentals_ttl_hours=FUNDAMENTALS_TTL_HOURS,
+                               financials_recheck_days=FINANCIALS_RECHECK_DAYS)
 
 # Initialize strategies
 strategies = {
@@ -217,20 +262,14 @@ def bulk_upload():
                 flash(f'Skipped entries: {", ".join(skipped_codes[:5])}...', 'info')
             return redirect(url_for('admin'))
 
-        success_count = 0
         failed_stocks = []
-        duplicate_stocks = []
-
-        for stock_code in stock_codes:
-            try:
-                result = data_manager.add_stock_to_group(stock_code, group)
-                if result:
-                    success_count += 1
-                else:
-                    duplicate_stocks.append(stock_code)
-            except Exception as e:
-                failed_stocks.append(stock_code)
-                logger.error(f"Exception adding {stock_code}: {e}")
+        result = data_manager.add_stocks_to_group(stock_codes, group)
+        if result is None:
+            added_stocks, duplicate_stocks = [], []
+            failed_stocks = stock_codes
+        else:
+            added_stocks, duplicate_stocks = result
+        success_count = len(added_stocks)
 
         # Provide detailed feedback
         if success_count > 0:
@@ -270,14 +309,21 @@ def user_dashboard():
     selected_group = request.args.get('group', 'V40')
     time_period = request.args.get('period', '1y')
 
-    stocks_data = data_manager.get_stocks_by_group(selected_group)
+    # Membership and prices from one data generation, even while a refresh is committing
+    with data_manager.read_snapshot():
+        stocks_data = data_manager.get_stocks_by_group(selected_group)
+        # Price history for the whole group in one query
+        group_data = data_manager.get_bulk_stock_data(group=selected_group, period=time_period)
 
     # Calculate strategy signals for each stock
     for stock in stocks_data:
         stock_code = stock['stock_code']
-        stock_data = data_manager.get_stock_data(stock_code, time_period)
+        stock_data = group_data.get(stock_code, pd.DataFrame())
 
         if not stock_data.empty:
+            # Indicators are computed once per stock and shared by all strategies
+            context = IndicatorContext(stock_data)
+
             # Get signals from all strategies with timeout protection
             strategy_signals = {}
             for strategy_name, strategy in strategies.items():
@@ -286,7 +332,7 @@ def user_dashboard():
                     from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 
                     with ThreadPoolExecutor(max_workers=1) as executor:
-                        future = executor.submit(strategy.get_signal, stock_data)
+                        future = executor.submit(strategy.get_signal, stock_data, context)
                         try:
                             strategy_signal = future.result(timeout=5)  # 5 second timeout
                             strategy_signals[strategy_name] = strategy_signal or 'Neutral'
@@ -355,19 +401,21 @@ def stock_detail(stock_code):
     """Detailed view of a single stock"""
     time_period = request.args.get('period', '1y')
 
-    # Get stock data
-    stock_data = data_manager.get_stock_data(stock_code, time_period)
-    fundamental_data = data_manager.get_fundamental_data(stock_code)
+    # Get stock data (prices and fundamentals from one data generation)
+    with data_manager.read_snapshot():
+        stock_data = data_manager.get_stock_data(stock_code, time_period)
+        fundamental_data = data_manager.get_fundamental_data(stock_code)
 
     if stock_data.empty:
         flash(f'No data available for stock {stock_code}', 'error')
         return redirect(url_for('user_dashboard'))
 
     # Generate strategy analysis for each applicable strategy
+    context = IndicatorContext(stock_data)
     strategy_analysis = {}
     for strategy_name, strategy in strategies.items():
         try:
-            analysis = strategy.analyze_stock(stock_data, fundamental_data)
+            analysis = strategy.analyze_stock(stock_data, fundamental_data, context)
             if analysis:
                 strategy_analysis[strategy_name] = analysis
         except Exception as e:
@@ -381,96 +429,82 @@ def stock_detail(stock_code):
                            time_period=time_period)
 
 
-@app.route('/refresh_data', methods=['POST'])
-def refresh_data():
-    """Refresh all stock data from Yahoo Finance with enhanced progress tracking"""
-    import time
+def summarize_refresh(job_status):
+    """Build the user-facing summary message and category for a finished refresh job"""
+    if job_status['status'] == 'failed':
+        return f'Critical error during refresh: {job_status["error"]}', 'error'
 
-    try:
-        start_time = time.time()
-        all_stocks = data_manager.get_all_stock_codes()
-        success_count = 0
-        error_count = 0
-        skipped_count = 0
+    success_count = job_status['success_count']
+    error_count = job_status['error_count']
+    skipped_count = job_status['skipped_count']
+    total_stocks = job_status['total']
+    duration = job_status['elapsed']
 
-        if not all_stocks:
-            flash('No stocks found to refresh', 'warning')
-            return redirect(request.referrer or url_for('user_dashboard'))
+    messages = []
+    if success_count > 0:
+        messages.append(f'Successfully refreshed {success_count} stocks')
 
-        logger.info(f"Starting refresh for {len(all_stocks)} stocks")
+    if skipped_count > 0:
+        messages.append(f'{skipped_count} stocks had no new data')
 
-        # Track progress for each stock
-        total_stocks = len(all_stocks)
+    if error_count > 0:
+        messages.append(f'{error_count} stocks failed to refresh')
 
-        for i, stock_code in enumerate(all_stocks, 1):
-            try:
-                # Log progress every 10 stocks
-                if i % 10 == 0 or i == total_stocks:
-                    logger.info(f"Processing stock {i}/{total_stocks}: {stock_code}")
-
-                stock_updated = False
-
-                # Fetch data for both 1y and 2y periods
-                for period in ['1y', '2y']:
-                    try:
-                        stock_data = yahoo_client.get_stock_data(stock_code, period)
-                        if not stock_data.empty:
-                            data_manager.save_stock_data(stock_code, stock_data, period)
-                            stock_updated = True
-                        else:
-                            logger.warning(f"No data returned for {stock_code} - {period}")
-                    except Exception as period_error:
-                        logger.error(f"Error fetching {period} data for {stock_code}: {period_error}")
-                        continue
-
-                # Fetch fundamental data
-                try:
-                    fundamental_data = yahoo_client.get_fundamental_data(stock_code)
-                    if fundamental_data:
-                        data_manager.save_fundamental_data(stock_code, fundamental_data)
-                        stock_updated = True
-                except Exception as fund_error:
-                    logger.warning(f"Error fetching fundamental data for {stock_code}: {fund_error}")
-
-                if stock_updated:
-                    success_count += 1
-                else:
-                    skipped_count += 1
-                    logger.warning(f"No data updated for {stock_code}")
+    rows = job_status.get('rows')
+    if rows and (rows['inserted'] or rows['updated'] or rows['deleted']):
+        messages.append(f'{rows["inserted"]} new bars, {rows["updated"]} revised, {rows["deleted"]} removed')
 
-            except Exception as e:
-                logger.error(f"Error refreshing {stock_code}: {e}")
-                error_count += 1
-                continue
+    if success_count > 0:
+        return f'Data refresh completed in {duration}s. {" | ".join(messages)}', 'success'
+    elif error_count == total_stocks:
+        return f'Refresh failed for all {total_stocks} stocks. Please check your internet connection.', 'error'
+    else:
+        return f'Partial refresh completed in {duration}s. {" | ".join(messages)}', 'warning'
 
-        end_time = time.time()
-        duration = round(end_time - start_time, 2)
 
-        # Prepare success message
-        messages = []
-        if success_count > 0:
-            messages.append(f'Successfully refreshed {success_count} stocks')
+def wants_json():
+    """Check whether the request came from the refresh script rather than a plain form post"""
+    return (request.headers.get('X-Requested-With') == 'XMLHttpRequest' or
+            request.accept_mimetypes.best == 'application/json')
 
-        if skipped_count > 0:
-            messages.append(f'{skipped_count} stocks had no new data')
 
-        if error_count > 0:
-            messages.append(f'{error_count} stocks failed to refresh')
+@app.route('/refresh_data', methods=['POST'])
+def refresh_data():
+    """Start a background refresh of all stock data from Yahoo Finance.
+    A request made while a refresh is running attaches to the existing job.
+    """
+    try:
+        all_stocks = data_manager.get_all_stock_codes()
 
-        # Create comprehensive flash message
-        if success_count > 0:
-            main_message = f'Data refresh completed in {duration}s. {" | ".join(messages)}'
-            flash(main_message, 'success')
-        elif error_count == total_stocks:
-            flash(f'Refresh failed for all {total_stocks} stocks. Please check your internet connection.', 'error')
-        else:
-            flash(f'Partial refresh completed in {duration}s. {" | ".join(messages)}', 'warning')
+        # Incremental by default; mode=full re-downloads every stock's history
+        refresh_mode = request.values.get('mode', 'incremental')
+        force_fundamentals = request.values.get('force_fundamentals', '').lower() in ('1', 'true', 'yes')
 
-        logger.info(
-            f"Refresh completed: {success_count} success, {error_count} errors, {skipped_count} skipped in {duration}s")
+        if not all_stocks:
+            if wants_json():
+                return jsonify({'status': 'error', 'message': 'No stocks found to refresh'}), 400
+            flash('No stocks found to refresh', 'warning')
+            return redirect(request.referrer or url_for('user_dashboard'))
+
+        job, started = refresh_engine.start_job(all_stocks, mode=refresh_mode,
+                                                force_fundamentals=force_fundamentals)
+        if started:
+            logger.info(f"Started {refresh_mode} refresh job {job.job_id} for {len(all_stocks)} stocks")
+
+        if wants_json():
+            status = job.to_dict()
+            status['attached'] = not started
+            return jsonify(status), 202
+
+        if started:
+            flash(f'Data refresh started for {len(all_stocks)} stocks', 'success')
+        else:
+            flash('A data refresh is already running', 'info')
 
     except Exception as e:
         logger.error(f"Critical refresh error: {e}")
+        if wants_json():
+            return jsonify({'status': 'error', 'message': str(e)}), 500
         flash(f'Critical error during refresh: {str(e)}', 'error')
 
     return redirect(request.referrer or url_for('user_dashboard'))
@@ -478,13 +512,49 @@ def refresh_data():
 
 @app.route('/api/refresh_status')
 def refresh_status():
-    """API endpoint to check refresh status (for future async implementation)"""
-    # This could be enhanced later to track refresh progress in real-time
-    # For now, just return a simple status
-    return jsonify({
-        'status': 'ready',
-        'message': 'Refresh functionality is available'
-    })
+    """API endpoint reporting progress of a refresh job (the latest one if no job_id is given)"""
+    job = refresh_engine.get_job(request.args.get('job_id'))
+
+    if job is None:
+        if request.args.get('job_id'):
+            return jsonify({'status': 'unknown', 'message': 'Refresh job not found'}), 404
+        return jsonify({
+            'status': 'ready',
+            'message': 'Refresh functionality is available'
+        })
+
+    status = job.to_dict()
+    if job.is_running:
+        status['message'] = f'Refreshed {status["done"]} of {status["total"]} stocks'
+    else:
+        status['message'], status['category'] = summarize_refresh(status)
+
+    return jsonify(status)
+
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """API endpoint with price frame cache counters"""
+    return jsonify(data_manager.get_frame_cache_stats())
+
+
+@app.route('/api/screen')
+def screen_stocks():
+    """API endpoint screening stocks on fundamentals, e.g. ?group=V40&pe_ratio_max=25&debt_to_equity_max=50"""
+    operators = {'_min': '>=', '_max': '<=', '_below': '<', '_above': '>'}
+    filters = []
+    try:
+        for name, value in request.args.items():
+            for suffix, operator in operators.items():
+                if name.endswith(suffix):
+                    filters.append((name[:-len(suffix)], operator, float(value)))
+                    break
+        results = data_manager.screen_fundamentals(filters, group=request.args.get('group'),
+                                                   order_by=request.args.get('sort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'count': len(results), 'stocks': results})
 
 
 @app.route('/api/chart_data/<stock_code>')
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import pandas as pd
 import numpy as np
+from .indicators import IndicatorContext
 
 class BaseStrategy(ABC):
     """Base class for all trading strategies"""
@@ -10,15 +11,16 @@ class BaseStrategy(ABC):
         self.applicable_groups = []
     
     @abstractmethod
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """
         Get trading signal for given stock data
+        context: optional IndicatorContext of stock_data shared with other strategies
         Returns: 'Buy', 'Sell', 'Watch', or 'Neutral'
         """
         pass
     
     @abstractmethod
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """
         Perform detailed analysis of a stock
         Returns: Dictionary with analysis results
@@ -26,7 +28,7 @@ class BaseStrategy(ABC):
         pass
     
     @abstractmethod
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """
         Get chart configuration with overlays and annotations
         Returns: Dictionary with Plotly chart configuration
@@ -39,22 +41,32 @@ class BaseStrategy(ABC):
             return True  # If no specific groups defined, apply to all
         return group in self.applicable_groups
     
-    def calculate_sma(self, data, period):
+    def indicators(self, data, context=None):
+        """Get the shared indicator context for data, or a private one if none was passed"""
+        if context is not None and context.data is data:
+            return context
+        return IndicatorContext(data)
+    
+    def memoized(self, stock_data, context, key, compute):
+        """Get this strategy's result named key for stock_data, computed with compute() once per
+        indicator context so get_signal, analyze_stock and get_chart_config can share it"""
+        return self.indicators(stock_data, context).get(f'{self.name}.{key}', compute)
+    
+    def calculate_sma(self, data, period, context=None):
         """Calculate Simple Moving Average"""
-        return data['Close'].rolling(window=period).mean()
+        return self.indicators(data, context).sma(period)
     
-    def calculate_ema(self, data, period):
+    def calculate_ema(self, data, period, context=None):
         """Calculate Exponential Moving Average"""
-        return data['Close'].ewm(span=period).mean()
+        return self.indicators(data, context).ema(period)
+    
+    def get_lifetime_high(self, data, context=None):
+        """Get the lifetime high, using the stored all-time high when the data carries one"""
+        return self.indicators(data, context).lifetime_high()
     
-    def calculate_rsi(self, data, period=14):
+    def calculate_rsi(self, data, period=14, context=None):
         """Calculate Relative Strength Index"""
-        delta = data['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
+        return self.indicators(data, context).rsi(period)
     
     def find_support_resistance(self, data, window=20):
         """Find support and resistance levels"""
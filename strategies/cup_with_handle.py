@@ -11,12 +11,12 @@ class CupWithHandleStrategy(BaseStrategy):
         self.applicable_groups = ['V40', 'V40_Next']
         self.min_gain_threshold = 0.15  # 15% minimum potential gain threshold for buy signal
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on Cup with Handle pattern"""
         if len(stock_data) < 100:
             return 'Neutral'
 
-        patterns = self._find_cwh_patterns(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_cwh_patterns(stock_data))
 
         if not patterns:
             return 'Neutral'
@@ -54,14 +54,14 @@ class CupWithHandleStrategy(BaseStrategy):
 
         return 'Neutral'
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed Cup with Handle analysis"""
         if len(stock_data) < 100:
             return None
 
-        patterns = self._find_cwh_patterns(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_cwh_patterns(stock_data))
         current_price = stock_data['Close'].iloc[-1]
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
 
         if not patterns:
             return {
@@ -118,12 +118,12 @@ class CupWithHandleStrategy(BaseStrategy):
             'active_pattern': active_pattern
         }
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with Cup with Handle pattern overlays"""
         if len(stock_data) < 100:
             return {}
 
-        patterns = self._find_cwh_patterns(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_cwh_patterns(stock_data))
 
         overlays = []
         annotations = []
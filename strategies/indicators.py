@@ -0,0 +1,58 @@
+class IndicatorContext:
+    """Indicators of one stock's price frame, computed on first use and shared by all strategies.
+
+    Build one per (stock, period) frame and pass it to every strategy's get_signal,
+    analyze_stock and get_chart_config, so each indicator is computed at most once. Strategies
+    can memoize their own derived results (e.g. detected patterns) with get().
+    """
+
+    def __init__(self, stock_data):
+        self.data = stock_data
+        self._values = {}
+
+    def get(self, name, compute):
+        """Get a named value, computing it with compute() the first time"""
+        if name not in self._values:
+            self._values[name] = compute()
+        return self._values[name]
+
+    def sma(self, period, field='Close'):
+        """Simple moving average of a field"""
+        return self.get(('sma', field, period), lambda: self.data[field].rolling(window=period).mean())
+
+    def ema(self, period):
+        """Exponential moving average of the close"""
+        return self.get(('ema', period), lambda: self.data['Close'].ewm(span=period).mean())
+
+    def close_diff(self):
+        """Day-over-day change of the close"""
+        return self.get('close_diff', lambda: self.data['Close'].diff())
+
+    def returns(self):
+        """Day-over-day percentage change of the close"""
+        return self.get('returns', lambda: self.data['Close'].pct_change())
+
+    def rsi(self, period=14):
+        """Relative Strength Index"""
+        def compute():
+            delta = self.close_diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+            rs = gain / loss
+            return 100 - (100 / (1 + rs))
+        return self.get(('rsi', period), compute)
+
+    def lifetime_high(self):
+        """Lifetime high, using the stored all-time high when the frame carries one"""
+        def compute():
+            window_high = self.data['High'].max()
+            stored_high = self.data.attrs.get('lifetime_high')
+            return max(window_high, stored_high) if stored_high else window_high
+        return self.get('lifetime_high', compute)
+
+    def period_low(self, days):
+        """Lowest low of the last `days` bars and its date"""
+        def compute():
+            lows = self.data['Low'].tail(days)
+            return lows.min(), lows.idxmin()
+        return self.get(('period_low', days), compute)
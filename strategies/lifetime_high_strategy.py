@@ -11,13 +11,13 @@ class LifetimeHighStrategy(BaseStrategy):
         self.max_discount_from_high = 0.30  # 30% below lifetime high
         self.target_gain_range = (0.30, 0.40)  # 30-40% gain target
     
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on Lifetime High strategy"""
         if len(stock_data) < 100:
             return 'Neutral'
         
         # Check if conditions are met
-        conditions = self._check_strategy_conditions(stock_data)
+        conditions = self._check_strategy_conditions(stock_data, context=context)
         
         if not conditions['qualified']:
             return 'Neutral'
@@ -41,14 +41,14 @@ class LifetimeHighStrategy(BaseStrategy):
         
         return 'Neutral'
     
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed Lifetime High strategy analysis"""
         if len(stock_data) < 100:
             return None
         
-        conditions = self._check_strategy_conditions(stock_data, fundamental_data)
+        conditions = self._check_strategy_conditions(stock_data, fundamental_data, context)
         current_price = stock_data['Close'].iloc[-1]
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
         
         entry_price = current_price
         target_price = conditions['lifetime_high']  # Target is always lifetime high
@@ -86,12 +86,12 @@ class LifetimeHighStrategy(BaseStrategy):
             'averaging_allowed': signal != 'Buy' or not conditions.get('ttm_at_highest', False)
         }
     
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with Lifetime High overlays"""
         if len(stock_data) < 100:
             return {}
         
-        conditions = self._check_strategy_conditions(stock_data)
+        conditions = self._check_strategy_conditions(stock_data, context=context)
         lifetime_high = conditions['lifetime_high']
         
         overlays = []
@@ -170,7 +170,7 @@ class LifetimeHighStrategy(BaseStrategy):
             'annotations': annotations
         }
     
-    def _check_strategy_conditions(self, stock_data, fundamental_data=None):
+    def _check_strategy_conditions(self, stock_data, fundamental_data=None, context=None):
         """Check if all strategy conditions are met"""
         conditions = {
             'qualified': False,
@@ -181,7 +181,8 @@ class LifetimeHighStrategy(BaseStrategy):
         }
         
         # Calculate lifetime high
-        lifetime_high = stock_data['High'].max()
+        indicators = self.indicators(stock_data, context)
+        lifetime_high = indicators.lifetime_high()
         current_price = stock_data['Close'].iloc[-1]
         discount_from_high = (lifetime_high - current_price) / lifetime_high
         
@@ -194,7 +195,8 @@ class LifetimeHighStrategy(BaseStrategy):
             conditions.update(ttm_analysis)
         else:
             # Simplified check based on recent price performance and volume
-            conditions['ttm_numbers_good'] = self._estimate_fundamental_strength(stock_data)
+            conditions['ttm_numbers_good'] = self.memoized(stock_data, context, 'fundamental_strength',
+                                                           lambda: self._estimate_fundamental_strength(stock_data))
         
         # Overall qualification
         conditions['qualified'] = (
@@ -214,6 +216,23 @@ class LifetimeHighStrategy(BaseStrategy):
         }
         
         try:
+            # Prefer real TTM figures computed from stored quarterly statements
+            ttm = fundamental_data.get('ttm', {})
+            revenue_ttm = ttm.get('revenue', {})
+            profit_ttm = ttm.get('net_income', {})
+            if revenue_ttm.get('growth') is not None and profit_ttm.get('growth') is not None:
+                revenue_growth = revenue_ttm['growth']
+                earnings_growth = profit_ttm['growth']
+                ttm_analysis['ttm_revenue_growth'] = f"{revenue_growth*100:.1f}%"
+                ttm_analysis['ttm_profit_growth'] = f"{earnings_growth*100:.1f}%"
+                ttm_analysis['ttm_at_highest'] = bool(revenue_ttm['ttm_at_highest'] and profit_ttm['ttm_at_highest'])
+                ttm_analysis['ttm_numbers_good'] = (
+                    revenue_growth > 0.10 and  # 10% revenue growth
+                    earnings_growth > 0.15 and  # 15% earnings growth
+                    profit_ttm['ttm'] > 0
+                )
+                return ttm_analysis
+            
             # Get growth metrics
             revenue_growth = fundamental_data.get('revenue_growth', 0)
             earnings_growth = fundamental_data.get('earnings_growth', 0)
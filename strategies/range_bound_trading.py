@@ -14,16 +14,16 @@ class RangeBoundTradingStrategy(BaseStrategy):
         self.min_touches = 2
         self.min_historical_data = 60  # Minimum 60 days of data
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on range-bound conditions"""
         if len(stock_data) < self.min_historical_data:
             return 'Neutral'
 
         # Use the FIXED range detection logic
-        result = self.calculate_range_bound_signal(stock_data)
+        result = self.memoized(stock_data, context, 'range_signal', lambda: self.calculate_range_bound_signal(stock_data))
         return result.get('signal', 'Neutral')
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed range-bound analysis with FIXED validation."""
         if len(stock_data) < self.min_historical_data:
             return {
@@ -37,7 +37,7 @@ class RangeBoundTradingStrategy(BaseStrategy):
             }
 
         # Use the FIXED analysis function
-        result = self.calculate_range_bound_signal(stock_data)
+        result = self.memoized(stock_data, context, 'range_signal', lambda: self.calculate_range_bound_signal(stock_data))
         signal = result.get('signal', 'Neutral')
         current_price = result.get('current_price', stock_data['Close'].iloc[-1])
         support_level = result.get('support_level')
@@ -365,13 +365,13 @@ class RangeBoundTradingStrategy(BaseStrategy):
         # Both support and resistance must have minimum touches
         return support_count >= min_touches and resistance_count >= min_touches
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with range overlays"""
         if len(stock_data) < self.min_historical_data:
             return {}
 
         # Get range details from the FIXED analysis
-        result = self.calculate_range_bound_signal(stock_data)
+        result = self.memoized(stock_data, context, 'range_signal', lambda: self.calculate_range_bound_signal(stock_data))
 
         overlays = []
         annotations = []
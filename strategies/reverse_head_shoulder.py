@@ -11,12 +11,12 @@ class ReverseHeadShoulderStrategy(BaseStrategy):
         self.applicable_groups = ['V40', 'V40_Next']
         self.min_gain_threshold = 0.15  # 15% minimum gain requirement
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on RHS pattern with 15% gain requirement"""
         if len(stock_data) < 100:
             return 'Neutral'
 
-        patterns = self._find_rhs_patterns(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_rhs_patterns(stock_data))
 
         if not patterns:
             return 'Neutral'
@@ -43,12 +43,12 @@ class ReverseHeadShoulderStrategy(BaseStrategy):
 
         return 'Neutral'
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed RHS analysis with 15% gain filtering"""
         if len(stock_data) < 100:
             return None
 
-        all_patterns = self._find_rhs_patterns(stock_data)
+        all_patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_rhs_patterns(stock_data))
         current_price = stock_data['Close'].iloc[-1]
 
         # Filter patterns by 15% gain requirement
@@ -58,7 +58,7 @@ class ReverseHeadShoulderStrategy(BaseStrategy):
             if potential_gain >= self.min_gain_threshold:
                 patterns.append(pattern)
 
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
 
         if not patterns:
             # Check if there were any patterns before filtering
@@ -111,13 +111,13 @@ class ReverseHeadShoulderStrategy(BaseStrategy):
             'rejected_patterns': len(all_patterns) - len(patterns)
         }
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with RHS pattern overlays"""
         if len(stock_data) < 100:
             return {}
 
         # Get all patterns first, then filter by gain requirement
-        all_patterns = self._find_rhs_patterns(stock_data)
+        all_patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_rhs_patterns(stock_data))
         current_price = stock_data['Close'].iloc[-1]
 
         patterns = []
@@ -11,7 +11,7 @@ class SimpleMovingAverageStrategy(BaseStrategy):
         self.applicable_groups = ['V40']
         self.sma_periods = [20, 50, 200]
 
-    def _calculate_sma_signal(self, stock_data):
+    def _calculate_sma_signal(self, stock_data, context=None):
         """
         Calculate Simple Moving Average signals based on strict AND conditions.
         This is the core signal generation method.
@@ -30,9 +30,9 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             }
 
         # Calculate SMAs
-        sma_20 = self.calculate_sma(stock_data, 20)
-        sma_50 = self.calculate_sma(stock_data, 50)
-        sma_200 = self.calculate_sma(stock_data, 200)
+        sma_20 = self.calculate_sma(stock_data, 20, context)
+        sma_50 = self.calculate_sma(stock_data, 50, context)
+        sma_200 = self.calculate_sma(stock_data, 200, context)
 
         # Get the latest values for comparison
         current_price = stock_data['Close'].iloc[-1]
@@ -79,26 +79,26 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             'price_sma_data': price_sma_data
         }
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """
         Get trading signal based on SMA conditions.
         This is a wrapper for the core logic to maintain compatibility.
         """
-        signal_data = self._calculate_sma_signal(stock_data)
+        signal_data = self._calculate_sma_signal(stock_data, context)
         return signal_data['signal']
 
-    def get_price_sma_data(self, stock_data):
+    def get_price_sma_data(self, stock_data, context=None):
         """
         Get current price and SMA values in a structured format.
         This is a new method to easily access price and SMA data.
         """
-        signal_data = self._calculate_sma_signal(stock_data)
+        signal_data = self._calculate_sma_signal(stock_data, context)
         return signal_data['price_sma_data']
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed SMA analysis using the updated logic"""
         # Use the new method to get all calculated data and reasoning at once
-        analysis = self._calculate_sma_signal(stock_data)
+        analysis = self._calculate_sma_signal(stock_data, context)
 
         # Exit if there's not enough data
         if analysis['sma_20'] is None:
@@ -130,7 +130,8 @@ class SimpleMovingAverageStrategy(BaseStrategy):
         ]
 
         # Signal details
-        confidence = self._calculate_confidence(stock_data, analysis['sma_20'], analysis['sma_50'], analysis['sma_200'])
+        confidence = self._calculate_confidence(stock_data, analysis['sma_20'], analysis['sma_50'], analysis['sma_200'],
+                                                context)
         signal_details = self.format_signal_details(signal, entry_price, target_price, confidence=confidence)
 
         # Add the detailed reason from our calculation
@@ -156,15 +157,15 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             }
         }
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with SMA overlays - Compatible with charts.js"""
         if len(stock_data) < 200:
             return {'overlays': [], 'annotations': []}
 
         try:
-            sma_20 = self.calculate_sma(stock_data, 20)
-            sma_50 = self.calculate_sma(stock_data, 50)
-            sma_200 = self.calculate_sma(stock_data, 200)
+            sma_20 = self.calculate_sma(stock_data, 20, context)
+            sma_50 = self.calculate_sma(stock_data, 50, context)
+            sma_200 = self.calculate_sma(stock_data, 200, context)
 
             # Clean NaN values for JSON serialization
             sma_20_clean = sma_20.fillna(np.nan).replace({np.nan: None}).tolist()
@@ -202,7 +203,7 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             ]
 
             # Get signal annotations
-            annotations = self._get_signal_annotations(stock_data, sma_20, sma_50, sma_200)
+            annotations = self._get_signal_annotations(stock_data, sma_20, sma_50, sma_200, context)
 
             return {
                 'overlays': overlays,
@@ -213,7 +214,7 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             print(f"Error in SMA chart config: {e}")
             return {'overlays': [], 'annotations': []}
 
-    def _calculate_confidence(self, stock_data, sma_20, sma_50, sma_200):
+    def _calculate_confidence(self, stock_data, sma_20, sma_50, sma_200, context=None):
         """Calculate confidence score for the signal"""
         try:
             current_price = stock_data['Close'].iloc[-1]
@@ -228,8 +229,8 @@ class SimpleMovingAverageStrategy(BaseStrategy):
                 sma_alignment_score = 30
 
             # Check volume confirmation
-            volume_score = 20 if stock_data['Volume'].iloc[-1] > stock_data['Volume'].rolling(20).mean().iloc[
-                -1] else 10
+            volume_sma_20 = self.indicators(stock_data, context).sma(20, field='Volume')
+            volume_score = 20 if stock_data['Volume'].iloc[-1] > volume_sma_20.iloc[-1] else 10
 
             # Check price position relative to SMAs
             price_position_score = 25 if sma_alignment_score > 0 else 0
@@ -242,7 +243,7 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             print(f"Error calculating SMA confidence: {e}")
             return 50
 
-    def _get_signal_annotations(self, stock_data, sma_20, sma_50, sma_200):
+    def _get_signal_annotations(self, stock_data, sma_20, sma_50, sma_200, context=None):
         """Get annotations for buy/sell signals"""
         try:
             annotations = []
@@ -250,7 +251,7 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             current_date = stock_data.index[-1]
 
             # We can still use the simple get_signal here as it's just for the annotation text
-            signal = self.get_signal(stock_data)
+            signal = self.get_signal(stock_data, context)
 
             if signal in ['Buy', 'Sell']:
                 annotations.append({
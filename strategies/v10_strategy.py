@@ -11,7 +11,7 @@ class V10Strategy(BaseStrategy):
         self.fall_threshold = 0.10  # 10% fall threshold
         self.min_gap_between_trades = 0.05  # 5% minimum gap between V10 trades
     
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on V10 conditions"""
         # V10 is an add-on strategy, so it needs to be used with RHS or CWH
         # This method should be called after checking RHS/CWH qualification
@@ -20,7 +20,7 @@ class V10Strategy(BaseStrategy):
             return 'Neutral'
         
         # Check if there's been a 10% fall from a recent high
-        v10_opportunities = self._find_v10_opportunities(stock_data)
+        v10_opportunities = self.memoized(stock_data, context, 'opportunities', lambda: self._find_v10_opportunities(stock_data))
         
         if not v10_opportunities:
             return 'Neutral'
@@ -38,14 +38,14 @@ class V10Strategy(BaseStrategy):
         
         return 'Watch'  # Monitoring for potential V10 opportunities
     
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed V10 analysis"""
         if len(stock_data) < 50:
             return None
         
-        v10_opportunities = self._find_v10_opportunities(stock_data)
+        v10_opportunities = self.memoized(stock_data, context, 'opportunities', lambda: self._find_v10_opportunities(stock_data))
         current_price = stock_data['Close'].iloc[-1]
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
         
         if not v10_opportunities:
             return {
@@ -87,12 +87,12 @@ class V10Strategy(BaseStrategy):
             'note': 'This strategy is applicable only after RHS or CWH qualification.'
         }
     
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with V10 overlays"""
         if len(stock_data) < 50:
             return {}
         
-        v10_opportunities = self._find_v10_opportunities(stock_data)
+        v10_opportunities = self.memoized(stock_data, context, 'opportunities', lambda: self._find_v10_opportunities(stock_data))
         
         overlays = []
         annotations = []
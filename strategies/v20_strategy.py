@@ -13,13 +13,13 @@ class V20Strategy(BaseStrategy):
         self.max_age_months = 12  # Only consider patterns within last 12 months
         self.averaging_gap = 0.10  # 10% gap for averaging down
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on V20 conditions"""
         if len(stock_data) < 30:
             return 'Neutral'
 
         # Find valid 20% green candle patterns
-        patterns = self._find_20_percent_green_movements(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_20_percent_green_movements(stock_data))
 
         if not patterns:
             return 'Neutral'
@@ -45,14 +45,14 @@ class V20Strategy(BaseStrategy):
 
         return 'Neutral'
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed V20 analysis"""
         if len(stock_data) < 30:
             return None
 
-        patterns = self._find_20_percent_green_movements(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_20_percent_green_movements(stock_data))
         current_price = stock_data['Close'].iloc[-1]
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
 
         if not patterns:
             return {
@@ -94,12 +94,12 @@ class V20Strategy(BaseStrategy):
             'active_pattern': active_pattern
         }
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with V20 pattern overlays"""
         if len(stock_data) < 30:
             return {}
 
-        patterns = self._find_20_percent_green_movements(stock_data)
+        patterns = self.memoized(stock_data, context, 'patterns', lambda: self._find_20_percent_green_movements(stock_data))
 
         overlays = []
         annotations = []
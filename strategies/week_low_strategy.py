@@ -14,13 +14,13 @@ class WeekLowStrategy(BaseStrategy):
         self.near_low_percentage = 0.05  # Within 5% of 52-week low
         self.target_multiplier = 1.0  # Target is lifetime high (no multiplier)
 
-    def get_signal(self, stock_data):
+    def get_signal(self, stock_data, context=None):
         """Get trading signal based on 52 Week Low strategy"""
         if len(stock_data) < 240:  # Need at least 1 year of data
             return 'Neutral'
 
         # Check if conditions are met
-        conditions = self._check_strategy_conditions(stock_data)
+        conditions = self._check_strategy_conditions(stock_data, context=context)
 
         if not conditions['qualified']:
             return 'Neutral'
@@ -44,7 +44,7 @@ class WeekLowStrategy(BaseStrategy):
 
         return 'Neutral'
 
-    def analyze_stock(self, stock_data, fundamental_data):
+    def analyze_stock(self, stock_data, fundamental_data, context=None):
         """Perform detailed 52 Week Low strategy analysis"""
         if len(stock_data) < 240:
             # Return analysis even with insufficient data
@@ -64,9 +64,9 @@ class WeekLowStrategy(BaseStrategy):
                 'averaging_allowed': True
             }
 
-        conditions = self._check_strategy_conditions(stock_data, fundamental_data)
+        conditions = self._check_strategy_conditions(stock_data, fundamental_data, context)
         current_price = stock_data['Close'].iloc[-1]
-        signal = self.get_signal(stock_data)
+        signal = self.get_signal(stock_data, context)
 
         entry_price = conditions['week_52_low']  # Entry at 52-week low
         target_price = conditions['lifetime_high']  # Target is lifetime high
@@ -111,12 +111,12 @@ class WeekLowStrategy(BaseStrategy):
             'averaging_allowed': True  # Always allow averaging for this strategy
         }
 
-    def get_chart_config(self, stock_data):
+    def get_chart_config(self, stock_data, context=None):
         """Get chart configuration with 52 Week Low overlays"""
         if len(stock_data) < 240:
             return {}
 
-        conditions = self._check_strategy_conditions(stock_data)
+        conditions = self._check_strategy_conditions(stock_data, context=context)
         week_52_low = conditions['week_52_low']
         lifetime_high = conditions['lifetime_high']
         current_price = stock_data['Close'].iloc[-1]
@@ -256,7 +256,7 @@ class WeekLowStrategy(BaseStrategy):
             'shapes': shapes
         }
 
-    def _check_strategy_conditions(self, stock_data, fundamental_data=None):
+    def _check_strategy_conditions(self, stock_data, fundamental_data=None, context=None):
         """Check if all strategy conditions are met"""
         conditions = {
             'qualified': False,
@@ -267,12 +267,11 @@ class WeekLowStrategy(BaseStrategy):
         }
 
         # Calculate 52-week low (last 252 trading days)
-        last_252_days = stock_data.tail(252)
-        week_52_low = last_252_days['Low'].min()
-        week_52_low_date = last_252_days['Low'].idxmin()
+        indicators = self.indicators(stock_data, context)
+        week_52_low, week_52_low_date = indicators.period_low(252)
 
         # Calculate lifetime high
-        lifetime_high = stock_data['High'].max()
+        lifetime_high = indicators.lifetime_high()
 
         # Current price and distance calculations
         current_price = stock_data['Close'].iloc[-1]
@@ -0,0 +1,16 @@
+from data_manager import DataManager
+
+
+def test_screen_excludes_stocks_missing_a_filtered_field(tmp_path):
+    data_manager = DataManager(data_dir=str(tmp_path))
+    data_manager.save_fundamental_data('VALUE', {'company_name': 'Value Ltd', 'pe_ratio': 12.0,
+                                                 'debt_to_equity': 20.0})
+    # Loss-making: Yahoo reports no trailing P/E
+    data_manager.save_fundamental_data('LOSS', {'company_name': 'Loss Ltd', 'pe_ratio': None,
+                                                'debt_to_equity': 10.0})
+
+    matches = data_manager.screen_fundamentals([('pe_ratio', '<', 25), ('debt_to_equity', '<', 50)])
+
+    assert [row['stock_code'] for row in matches] == ['VALUE']
+    assert 'pe_ratio' not in data_manager.get_fundamental_data('LOSS')
+    assert data_manager.get_fundamental_data('LOSS')['debt_to_equity'] == 10.0
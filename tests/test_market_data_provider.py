@@ -0,0 +1,33 @@
+import pandas as pd
+
+from market_data_provider import LocalReplayProvider
+
+
+class KolkataProvider(LocalReplayProvider):
+    """Serves history the way yfinance's Ticker.history does: exchange-local timestamps and
+    dividend/split columns"""
+
+    def get_stock_data(self, stock_code, period='1y'):
+        index = pd.date_range('2024-01-01', periods=30, freq='B', tz='Asia/Kolkata', name='Date')
+        return pd.DataFrame({
+            'Open': 100.0, 'High': 101.0, 'Low': 99.0, 'Close': 100.5, 'Volume': 1000,
+            'Dividends': 0.0, 'Stock Splits': 0.0
+        }, index=index)
+
+    def get_fundamental_data(self, stock_code):
+        return {}
+
+    def get_company_financials(self, stock_code):
+        return {}
+
+
+def test_recorded_history_replays_with_start(tmp_path):
+    replay = LocalReplayProvider(data_dir=str(tmp_path), synthetic=False)
+    replay.record(KolkataProvider(synthetic=False), ['TCS'])
+
+    data = replay.get_bulk_stock_data(['TCS'], start='2024-02-01')['TCS']
+
+    assert list(data.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert data.index.tz is None
+    assert data.index[0] == pd.Timestamp('2024-02-01')
+    assert len(data) == 7
@@ -1,105 +1,243 @@
+import time
+import random
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
+from market_data_provider import MarketDataProvider, FetchError, SymbolCircuitBreaker
 
-class YahooFinanceClient:
-    def __init__(self):
-        pass
+class YahooFinanceClient(MarketDataProvider):
+    def __init__(self, bulk_chunk_size=50, max_retries=3, backoff_base=1.0, backoff_max=30.0,
+                 failure_threshold=3, negative_cache_hours=24):
+        # Number of symbols requested together in one bulk download
+        self.bulk_chunk_size = bulk_chunk_size
+        
+        # get_company_financials reads six statement properties, each a separate request
+        self.financials_request_count = 6
+        
+        # Retries with jittered exponential backoff for failing requests
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        # Symbols whose price history keeps coming back empty (delisted/renamed) are skipped for a while
+        self.circuit_breaker = SymbolCircuitBreaker(failure_threshold, negative_cache_hours)
     
-    def get_stock_data(self, stock_code, period='1y'):
-        """Fetch OHLCV data from Yahoo Finance"""
-        try:
-            # Add .NS suffix for NSE stocks if not already present
-            if not stock_code.endswith('.NS'):
-                symbol = f"{stock_code}.NS"
-            else:
-                symbol = stock_code
-            
-            # Create ticker object
-            ticker = yf.Ticker(symbol)
-            
-            # Fetch historical data
-            data = ticker.history(period=period)
+    def _to_symbol(self, stock_code):
+        """Add .NS suffix for NSE stocks if not already present"""
+        if not stock_code.endswith('.NS'):
+            return f"{stock_code}.NS"
+        return stock_code
+    
+    def _backoff_delay(self, attempt):
+        """Jittered exponential backoff before retry number attempt (1-based)"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _call_with_retries(self, stock_code, fetch, is_empty, track_failures=False):
+        """Call fetch() with bounded retries.
+        Exceptions are retried with backoff; an empty result is final and raises a 'no_data'
+        FetchError (counted by the circuit breaker when track_failures is set).
+        """
+        self.circuit_breaker.check(stock_code)
+        
+        last_error = None
+        for attempt in range(1, self.max_retries + 2):
+            if attempt > 1:
+                time.sleep(self._backoff_delay(attempt - 1))
             
-            if data.empty:
-                print(f"No data found for {symbol}")
-                return pd.DataFrame()
+            try:
+                result = fetch()
+            except Exception as e:
+                last_error = e
+                continue
             
-            # Clean and prepare data
-            data = data.dropna()
+            if is_empty(result):
+                if track_failures:
+                    self.circuit_breaker.record_failure(stock_code)
+                raise FetchError(stock_code, 'no_data', 'no data returned', attempt)
             
-            return data
-        except Exception as e:
-            print(f"Error fetching stock data for {stock_code}: {e}")
-            return pd.DataFrame()
+            if track_failures:
+                self.circuit_breaker.record_success(stock_code)
+            return result
+        
+        raise FetchError(stock_code, 'network', str(last_error), self.max_retries + 1)
+    
+    def get_stock_data(self, stock_code, period='1y'):
+        """Fetch OHLCV data from Yahoo Finance"""
+        ticker = yf.Ticker(self._to_symbol(stock_code))
+        
+        # Fetch historical data
+        data = self._call_with_retries(
+            stock_code,
+            lambda: ticker.history(period=period).dropna(),
+            lambda data: data.empty,
+            track_failures=True
+        )
+        return data
     
     def get_fundamental_data(self, stock_code):
         """Fetch fundamental data from Yahoo Finance"""
-        try:
-            # Add .NS suffix for NSE stocks if not already present
-            if not stock_code.endswith('.NS'):
-                symbol = f"{stock_code}.NS"
-            else:
-                symbol = stock_code
-            
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            
-            # Extract relevant fundamental data
-            fundamental_data = {
-                'company_name': info.get('longName', 'N/A'),
-                'industry_sector': info.get('sector', 'N/A'),
-                'industry': info.get('industry', 'N/A'),
-                'current_price': info.get('currentPrice', 0),
-                'pe_ratio': info.get('trailingPE', 0),
-                'debt_to_equity': info.get('debtToEquity', 0),
-                'week_52_high': info.get('fiftyTwoWeekHigh', 0),
-                'week_52_low': info.get('fiftyTwoWeekLow', 0),
-                'market_cap': info.get('marketCap', 0),
-                'book_value': info.get('bookValue', 0),
-                'dividend_yield': info.get('dividendYield', 0),
-                'beta': info.get('beta', 0),
-                'earnings_growth': info.get('earningsGrowth', 0),
-                'revenue_growth': info.get('revenueGrowth', 0),
-                'profit_margins': info.get('profitMargins', 0),
-                'operating_margins': info.get('operatingMargins', 0),
-                'return_on_equity': info.get('returnOnEquity', 0),
-                'return_on_assets': info.get('returnOnAssets', 0),
-                'current_ratio': info.get('currentRatio', 0),
-                'quick_ratio': info.get('quickRatio', 0),
-                'business_summary': info.get('businessSummary', 'N/A'),
-                'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-            # Calculate lifetime high (approximate using available data)
-            historical_data = ticker.history(period='max')
-            if not historical_data.empty:
-                fundamental_data['lifetime_high'] = historical_data['High'].max()
-            else:
-                fundamental_data['lifetime_high'] = fundamental_data['week_52_high']
-            
-            return fundamental_data
-        except Exception as e:
-            print(f"Error fetching fundamental data for {stock_code}: {e}")
-            return {}
+        ticker = yf.Ticker(self._to_symbol(stock_code))
+        
+        info = self._call_with_retries(
+            stock_code,
+            lambda: ticker.info,
+            lambda info: not info or not any(info.get(key) for key in ('longName', 'shortName', 'currentPrice'))
+        )
+        
+        # Extract relevant fundamental data; numbers Yahoo doesn't report stay None (not 0)
+        fundamental_data = {
+            'company_name': info.get('longName', 'N/A'),
+            'industry_sector': info.get('sector', 'N/A'),
+            'industry': info.get('industry', 'N/A'),
+            'current_price': info.get('currentPrice'),
+            'pe_ratio': info.get('trailingPE'),
+            'debt_to_equity': info.get('debtToEquity'),
+            'week_52_high': info.get('fiftyTwoWeekHigh'),
+            'week_52_low': info.get('fiftyTwoWeekLow'),
+            'market_cap': info.get('marketCap'),
+            'book_value': info.get('bookValue'),
+            'dividend_yield': info.get('dividendYield'),
+            'beta': info.get('beta'),
+            'earnings_growth': info.get('earningsGrowth'),
+            'revenue_growth': info.get('revenueGrowth'),
+            'profit_margins': info.get('profitMargins'),
+            'operating_margins': info.get('operatingMargins'),
+            'return_on_equity': info.get('returnOnEquity'),
+            'return_on_assets': info.get('returnOnAssets'),
+            'current_ratio': info.get('currentRatio'),
+            'quick_ratio': info.get('quickRatio'),
+            'business_summary': info.get('businessSummary', 'N/A'),
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        return fundamental_data
+    
+    def get_lifetime_high(self, stock_code):
+        """Fetch the all-time high from the full price history (used once to seed the stored value)
+        Returns: (lifetime_high, high_date)
+        """
+        historical_data = self.get_stock_data(stock_code, period='max')
+        return float(historical_data['High'].max()), historical_data['High'].idxmax().strftime('%Y-%m-%d')
     
     def get_company_financials(self, stock_code):
         """Fetch detailed financial statements"""
-        try:
-            if not stock_code.endswith('.NS'):
-                symbol = f"{stock_code}.NS"
-            else:
-                symbol = stock_code
-            
-            ticker = yf.Ticker(symbol)
-            
-            financials = {
+        ticker = yf.Ticker(self._to_symbol(stock_code))
+        
+        def fetch_financials():
+            return {
                 'income_statement': ticker.financials.to_dict() if hasattr(ticker, 'financials') else {},
                 'balance_sheet': ticker.balance_sheet.to_dict() if hasattr(ticker, 'balance_sheet') else {},
-                'cash_flow': ticker.cashflow.to_dict() if hasattr(ticker, 'cashflow') else {}
+                'cash_flow': ticker.cashflow.to_dict() if hasattr(ticker, 'cashflow') else {},
+                'quarterly_income_statement': ticker.quarterly_financials.to_dict()
+                if hasattr(ticker, 'quarterly_financials') else {},
+                'quarterly_balance_sheet': ticker.quarterly_balance_sheet.to_dict()
+                if hasattr(ticker, 'quarterly_balance_sheet') else {},
+                'quarterly_cash_flow': ticker.quarterly_cashflow.to_dict()
+                if hasattr(ticker, 'quarterly_cashflow') else {}
             }
+        
+        return self._call_with_retries(
+            stock_code,
+            fetch_financials,
+            lambda financials: not any(financials.values())
+        )
+    
+    def get_bulk_stock_data(self, stock_codes, period='1y', start=None):
+        """Fetch OHLCV data for many stocks, one Yahoo request per chunk of symbols
+        When start is given, only bars from that date onward are fetched.
+        Returns: Dictionary of stock_code -> DataFrame, or FetchError for stocks that failed
+        """
+        history_kwargs = {'start': start} if start else {'period': period}
+        
+        results = {}
+        for offset in range(0, len(stock_codes), self.bulk_chunk_size):
+            chunk = stock_codes[offset:offset + self.bulk_chunk_size]
+            results.update(self._download_chunk(chunk, **history_kwargs))
+        return results
+    
+    def _download_chunk(self, stock_codes, **history_kwargs):
+        """Download one chunk of symbols, retrying the symbols that are still missing"""
+        results = {}
+        pending = []
+        for stock_code in stock_codes:
+            try:
+                self.circuit_breaker.check(stock_code)
+                pending.append(stock_code)
+            except FetchError as e:
+                results[stock_code] = e
+        
+        last_error = None
+        returned_data = False  # Whether any symbol of the chunk returned data on any attempt
+        attempt = 0
+        while pending and attempt <= self.max_retries:
+            if attempt > 0:
+                time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+            
+            try:
+                frames = self._download(pending, **history_kwargs)
+            except Exception as e:
+                last_error = e
+                continue
+            
+            # yfinance swallows per-symbol errors; nothing at all for several symbols
+            # points to throttling or an outage rather than delisted symbols
+            if not frames and len(pending) > 1 and not returned_data:
+                last_error = 'no symbol in the request returned data'
+                continue
+            last_error = None
+            
+            # Other symbols of the chunk did return data, or a single symbol came back empty (as in
+            # _call_with_retries): the rest are missing on Yahoo's side
+            if not frames:
+                break
+            
+            returned_data = True
+            for stock_code, frame in frames.items():
+                self.circuit_breaker.record_success(stock_code)
+                results[stock_code] = frame
+            pending = [stock_code for stock_code in pending if stock_code not in frames]
+        
+        for stock_code in pending:
+            if last_error is not None:
+                results[stock_code] = FetchError(stock_code, 'network', str(last_error), attempt)
+            else:
+                self.circuit_breaker.record_failure(stock_code)
+                results[stock_code] = FetchError(stock_code, 'no_data', 'no data returned', attempt)
+        
+        return results
+    
+    def _download(self, stock_codes, **history_kwargs):
+        """Download symbols in a single request and split it per stock
+        Returns: Dictionary of stock_code -> DataFrame for the stocks that returned data
+        """
+        symbols = [self._to_symbol(code) for code in stock_codes]
+        data = yf.download(
+            symbols,
+            group_by='ticker',
+            auto_adjust=True,
+            actions=False,
+            threads=True,
+            progress=False,
+            **history_kwargs
+        )
+        
+        frames = {}
+        if data is None or data.empty:
+            return frames
+        
+        for stock_code, symbol in zip(stock_codes, symbols):
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
             
-            return financials
-        except Exception as e:
-            print(f"Error fetching financials for {stock_code}: {e}")
-            return {}
+            # Rows padded for other symbols' trading days come back as NaN
+            frame = frame[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+            if not frame.empty:
+                frames[stock_code] = frame
+        
+        return frames